@@ -32,5 +32,6 @@ class EventType(str, Enum):
     BATCH_COMPLETE = "batch.complete"
 
 
-def log(conn: Connection, run_id: str, event_type: EventType, details: dict, actor: str = "system") -> str:
-    return log_event(conn, run_id, actor, event_type.value, details)
+def log(conn: Connection, run_id: str, event_type: str, details: dict, actor: str = "system") -> str:
+    """Record an audit event. EventType members are str subclasses and are stored as-is."""
+    return log_event(conn, run_id, actor, event_type, details)
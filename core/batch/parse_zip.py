@@ -1,5 +1,5 @@
 """
-Parse a ZIP archive of radiology cases into a list of (case_id, image_path, report_text) tuples.
+Parse a ZIP archive of radiology cases into a list of (case_id, image, report_text) tuples.
 
 Expected ZIP structure (either flat or one-folder-per-case):
 
@@ -18,93 +18,182 @@ Per-folder:
     case02/
       image.jpg
       report.txt
+
+Entries are classified in a single pass over the archive index and read
+directly from the ZIP; nothing is written to disk unless extract_dir is given.
+Images are decoded lazily: each CaseInput carries a loader that opens its
+image only when the batch runner is ready to audit that case.
 """
+import io
+import mmap
+import struct
 import zipfile
-from pathlib import Path
-from typing import NamedTuple
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import Callable, NamedTuple, Optional
 
 from PIL import Image
 
 
 IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif", ".webp"}
-REPORT_NAMES = {"report.txt", "report.md", "findings.txt", "text.txt"}
+REPORT_EXTS = {".txt", ".md"}
+REPORT_NAMES = ("report.txt", "report.md", "findings.txt", "text.txt")
+
+
+class SkippedCase(NamedTuple):
+    case_id: str
+    reason: str
 
 
 class CaseInput(NamedTuple):
     case_id: str
-    image: Image.Image
+    image_loader: Callable[[], Image.Image]
     report_text: str
 
 
-def parse_zip(zip_path: Path, extract_dir: Path) -> list[CaseInput]:
+def _is_image_bytes(head: bytes) -> bool:
+    """Cheap magic-byte check for the supported image formats."""
+    return (
+        head.startswith(b"\x89PNG\r\n\x1a\n")
+        or head.startswith(b"\xff\xd8\xff")
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+        or head.startswith(b"BM")
+        or head[:4] in (b"II*\x00", b"MM\x00*")
+    )
+
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+def _read_stored(zip_path: Path, zi: zipfile.ZipInfo) -> bytes:
+    """Slice an uncompressed entry straight out of a memory-mapped archive."""
+    with open(zip_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header = _LOCAL_HEADER.unpack_from(mm, zi.header_offset)
+        if header[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad local file header for {zi.filename}")
+        name_len, extra_len = header[-2], header[-1]
+        start = zi.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+        return mm[start:start + zi.file_size]
+
+
+def _load_image(zip_path: Path, zi: zipfile.ZipInfo) -> Image.Image:
+    """Decode a single image entry from the archive as RGB."""
+    # Images are usually STORED (already compressed), so skip zipfile's reader for them
+    if zi.compress_type == zipfile.ZIP_STORED and not zi.flag_bits & 0x1:
+        data = _read_stored(zip_path, zi)
+    else:
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            data = zf.read(zi)
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    # Most colour scans are already RGB; only pay for a converted copy when needed
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def parse_zip(zip_path: Path, extract_dir: Optional[Path] = None) -> tuple[list[CaseInput], list[SkippedCase]]:
     """
-    Extract and parse a ZIP archive into CaseInput list.
+    Parse a ZIP archive into (cases, skipped).
+
+    Image entries are sniffed by their leading bytes before any decode, and
+    cases with an unreadable report or non-image payload are returned in
+    skipped with the reason. If extract_dir is given, the image/report entries
+    that form cases are also extracted there (for debugging).
     Raises ValueError if no valid cases are found.
     """
-    extract_dir.mkdir(parents=True, exist_ok=True)
+    # Folder entries keep the (name, suffix) computed here so the per-folder
+    # lookups below don't re-parse every path.
+    folders: dict[str, list[tuple[str, str, zipfile.ZipInfo]]] = {}
+    flat: dict[str, dict[str, zipfile.ZipInfo]] = {}
 
     with zipfile.ZipFile(zip_path, "r") as zf:
-        zf.extractall(extract_dir)
-
-    cases: list[CaseInput] = []
-
-    # Strategy 1: per-folder layout
-    for folder in sorted(extract_dir.iterdir()):
-        if not folder.is_dir():
-            continue
-        img_path = _find_image(folder)
-        rpt_path = _find_report(folder)
-        if img_path and rpt_path:
-            try:
-                img = Image.open(img_path).convert("RGB")
-                text = rpt_path.read_text(encoding="utf-8", errors="replace")
-                cases.append(CaseInput(case_id=folder.name, image=img, report_text=text.strip()))
-            except Exception:
-                pass
-
-    # Strategy 2: flat layout (image+report share same stem)
-    if not cases:
-        files_by_stem: dict[str, dict] = {}
-        for f in extract_dir.iterdir():
-            if f.is_file():
-                stem = f.stem
-                ext = f.suffix.lower()
+        for zi in zf.infolist():
+            if zi.is_dir():
+                continue
+            p = PurePosixPath(zi.filename)
+            if p.name.startswith(".") or "__MACOSX" in p.parts:
+                continue
+            ext = p.suffix.lower()
+            if len(p.parts) == 2:
+                folders.setdefault(p.parts[0], []).append((p.name, ext, zi))
+            elif len(p.parts) == 1:
                 if ext in IMAGE_EXTS:
-                    files_by_stem.setdefault(stem, {})["image"] = f
-                elif ext in {".txt", ".md"}:
-                    files_by_stem.setdefault(stem, {})["report"] = f
-
-        for stem, parts in sorted(files_by_stem.items()):
-            if "image" in parts and "report" in parts:
-                try:
-                    img = Image.open(parts["image"]).convert("RGB")
-                    text = parts["report"].read_text(encoding="utf-8", errors="replace")
-                    cases.append(CaseInput(case_id=stem, image=img, report_text=text.strip()))
-                except Exception:
-                    pass
+                    flat.setdefault(p.stem, {})["image"] = zi
+                elif ext in REPORT_EXTS:
+                    flat.setdefault(p.stem, {})["report"] = zi
+
+        # Strategy 1: per-folder layout
+        folder_pairs: list[tuple[str, zipfile.ZipInfo, zipfile.ZipInfo]] = []
+        for folder, entries in sorted(folders.items()):
+            img_zi = _find_image(entries)
+            rpt_zi = _find_report(entries)
+            if img_zi and rpt_zi:
+                folder_pairs.append((folder, img_zi, rpt_zi))
+        cases, skipped = _build_cases(zf, zip_path, folder_pairs, extract_dir)
+
+        # Strategy 2: flat layout (image+report share same stem), if no folder case was usable
+        if not cases:
+            flat_pairs = [
+                (stem, parts["image"], parts["report"])
+                for stem, parts in sorted(flat.items())
+                if "image" in parts and "report" in parts
+            ]
+            cases, flat_skipped = _build_cases(zf, zip_path, flat_pairs, extract_dir)
+            skipped += flat_skipped
 
     if not cases:
+        detail = "".join(f" Skipped {c.case_id}: {c.reason}." for c in skipped)
         raise ValueError(
             "No valid cases found in ZIP. Each case needs an image file "
-            "(.png/.jpg/etc.) paired with a report (.txt)."
+            "(.png/.jpg/etc.) paired with a report (.txt)." + detail
         )
 
-    return cases
+    return cases, skipped
 
 
-def _find_image(folder: Path) -> Path | None:
-    for f in folder.iterdir():
-        if f.is_file() and f.suffix.lower() in IMAGE_EXTS:
-            return f
+def _build_cases(
+    zf: zipfile.ZipFile,
+    zip_path: Path,
+    pairs: list[tuple[str, zipfile.ZipInfo, zipfile.ZipInfo]],
+    extract_dir: Optional[Path],
+) -> tuple[list[CaseInput], list[SkippedCase]]:
+    """Read each pair's report and sniff its image, splitting pairs into cases and skips."""
+    cases: list[CaseInput] = []
+    skipped: list[SkippedCase] = []
+    for case_id, img_zi, rpt_zi in pairs:
+        try:
+            with zf.open(img_zi) as fh:
+                head = fh.read(16)
+            text = zf.read(rpt_zi).decode("utf-8", errors="replace")
+        except Exception as e:
+            skipped.append(SkippedCase(case_id, f"unreadable entry: {e}"))
+            continue
+        if not _is_image_bytes(head):
+            skipped.append(SkippedCase(case_id, f"{PurePosixPath(img_zi.filename).name} is not a supported image"))
+            continue
+        loader = partial(_load_image, zip_path, img_zi)
+        cases.append(CaseInput(case_id=case_id, image_loader=loader, report_text=text.strip()))
+        if extract_dir is not None:
+            extract_dir.mkdir(parents=True, exist_ok=True)
+            zf.extract(img_zi, extract_dir)
+            zf.extract(rpt_zi, extract_dir)
+    return cases, skipped
+
+
+def _find_image(entries: list[tuple[str, str, zipfile.ZipInfo]]) -> zipfile.ZipInfo | None:
+    for _name, ext, zi in entries:
+        if ext in IMAGE_EXTS:
+            return zi
     return None
 
 
-def _find_report(folder: Path) -> Path | None:
+def _find_report(entries: list[tuple[str, str, zipfile.ZipInfo]]) -> zipfile.ZipInfo | None:
+    by_name = {name: zi for name, _ext, zi in entries}
     for name in REPORT_NAMES:
-        p = folder / name
-        if p.exists():
-            return p
-    for f in folder.iterdir():
-        if f.is_file() and f.suffix.lower() in {".txt", ".md"}:
-            return f
+        if name in by_name:
+            return by_name[name]
+    for _name, ext, zi in entries:
+        if ext in REPORT_EXTS:
+            return zi
     return None
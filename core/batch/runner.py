@@ -1,11 +1,15 @@
 """
-Sequential batch audit runner.
+Concurrent batch audit runner.
 
 Processes a ZIP archive of radiology cases by running the full 6-step audit
-pipeline on each case. Collects per-case results and computes batch-level
-summary statistics (average score, severity distribution, failure rate).
+pipeline on each case. Cases are audited on a thread pool bounded by
+RTL_BATCH_WORKERS. Collects per-case results (in archive order) and computes
+batch-level summary statistics (average score, severity distribution, failure rate).
 """
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Callable, Optional
 
@@ -19,7 +23,7 @@ logger = logging.getLogger(__name__)
 
 def run_batch(
     zip_path: Path,
-    extract_dir: Path,
+    extract_dir: Optional[Path] = None,
     progress_cb: Optional[Callable[[int, int, str], None]] = None,
 ) -> dict:
     """
@@ -27,50 +31,74 @@ def run_batch(
 
     Returns a batch_result dict with per-case results and summary statistics.
     """
-    cases: list[CaseInput] = parse_zip(zip_path, extract_dir)
+    cases, skipped = parse_zip(zip_path, extract_dir)
+    for sk in skipped:
+        logger.warning("Skipping case %s: %s", sk.case_id, sk.reason)
     total = len(cases)
-    results = []
+    results_by_index: dict[int, dict] = {}
     errors = []
+    lock = threading.Lock()
 
-    for i, case in enumerate(cases, start=1):
+    def report(i: int, msg: str) -> None:
         if progress_cb:
-            progress_cb(i, total, f"Auditing case {i}/{total}: {case.case_id}")
+            with lock:
+                progress_cb(i, total, msg)
 
-        try:
-            def case_progress(step, total_steps, msg):
-                if progress_cb:
-                    detail = f"[{case.case_id}] {msg}"
-                    progress_cb(i, total, detail)
+    def audit_case(i: int, case: CaseInput) -> dict:
+        report(i, f"Auditing case {i}/{total}: {case.case_id}")
+
+        def case_progress(step, total_steps, msg):
+            report(i, f"[{case.case_id}] {msg}")
 
-            result = run_audit(
-                image=case.image,
+        image = case.image_loader()
+        try:
+            return run_audit(
+                image=image,
                 report_text=case.report_text,
                 case_label=case.case_id,
                 progress_cb=case_progress,
             )
-            results.append(result)
-        except Exception as e:
-            logger.error("Case %s failed: %s", case.case_id, e)
-            errors.append({"case_id": case.case_id, "error": str(e)})
+        finally:
+            image.close()
+
+    max_workers = max(1, min(config.RTL_BATCH_WORKERS, total))
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(audit_case, i, case): (i, case) for i, case in enumerate(cases, start=1)}
+        for fut in as_completed(futures):
+            i, case = futures[fut]
+            try:
+                result = fut.result()
+                with lock:
+                    results_by_index[i] = result
+            except Exception as e:
+                logger.error("Case %s failed: %s", case.case_id, e)
+                with lock:
+                    errors.append({"case_id": case.case_id, "error": str(e)})
+
+    results = [results_by_index[i] for i in sorted(results_by_index)]
 
-    # Compute batch summary
-    scores = [r["overall_score"] for r in results]
-    severities = [r["severity"] for r in results]
+    # Compute batch summary in a single pass
+    score_total = 0
+    needs_review = 0
+    severity_counts: Counter[str] = Counter()
+    for r in results:
+        score_total += r["overall_score"]
+        severity_counts[r["severity"]] += 1
+        needs_review += r["severity"] in ("medium", "high")
 
     summary = {
         "total_cases": total,
         "completed": len(results),
         "failed": len(errors),
-        "avg_score": round(sum(scores) / len(scores), 1) if scores else 0,
+        "avg_score": round(score_total / len(results), 1) if results else 0,
         "severity_distribution": {
-            "low": severities.count("low"),
-            "medium": severities.count("medium"),
-            "high": severities.count("high"),
+            "low": severity_counts["low"],
+            "medium": severity_counts["medium"],
+            "high": severity_counts["high"],
         },
-        "pct_needing_review": round(
-            sum(1 for r in results if r["severity"] in ("medium", "high")) / max(len(results), 1) * 100, 1
-        ),
+        "pct_needing_review": round(needs_review / max(len(results), 1) * 100, 1),
         "errors": errors,
+        "skipped": [sk._asdict() for sk in skipped],
     }
 
     return {
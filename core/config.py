@@ -24,12 +24,28 @@ RTL_LORA_ID: str = os.getenv("RTL_LORA_ID", "")
 MEDGEMMA_MOCK: bool = os.getenv("MEDGEMMA_MOCK", "false").lower() == "true"
 MEDGEMMA_INFERENCE_MODE: str = os.getenv("MEDGEMMA_INFERENCE_MODE", "local")
 MEDGEMMA_MAX_NEW_TOKENS: int = int(os.getenv("MEDGEMMA_MAX_NEW_TOKENS", "1024"))
+# Maximum number of API inference calls in flight at once (shared API quota)
+MEDGEMMA_MAX_CONCURRENCY: int = int(os.getenv("MEDGEMMA_MAX_CONCURRENCY", "2"))
+# Local mode coalesces concurrent prompts into one padded generate() call:
+# at most MEDGEMMA_BATCH_SIZE prompts, waiting up to MEDGEMMA_BATCH_WAIT_MS for peers
+MEDGEMMA_BATCH_SIZE: int = int(os.getenv("MEDGEMMA_BATCH_SIZE", "4"))
+MEDGEMMA_BATCH_WAIT_MS: int = int(os.getenv("MEDGEMMA_BATCH_WAIT_MS", "10"))
+# torch.compile the local model's forward pass (slow first call; opt-in)
+MEDGEMMA_COMPILE: bool = os.getenv("MEDGEMMA_COMPILE", "false").lower() in ("1", "true")
+# Weight-only quantization for local mode via bitsandbytes: "" (bf16), "int8" or "nf4"
+MEDGEMMA_QUANTIZE: str = os.getenv("MEDGEMMA_QUANTIZE", "").lower()
+# Optional small model sharing MedGemma's tokenizer, used as the draft for
+# assisted (speculative) decoding of single text-only prompts in local mode
+MEDGEMMA_DRAFT_MODEL_ID: str = os.getenv("MEDGEMMA_DRAFT_MODEL_ID", "")
 
 # ── Pipeline ───────────────────────────────────────────────────────────────
 RTL_PROMPT_VERSION: str = os.getenv("RTL_PROMPT_VERSION", "v1")
 PROMPTS_DIR: Path = ROOT / "core" / "pipeline" / "prompts" / RTL_PROMPT_VERSION
 SCHEMAS_DIR: Path = ROOT / "core" / "pipeline" / "schemas"
 
+# ── Batch ──────────────────────────────────────────────────────────────────
+RTL_BATCH_WORKERS: int = int(os.getenv("RTL_BATCH_WORKERS", "4"))
+
 # ── Storage ────────────────────────────────────────────────────────────────
 _storage_env = os.getenv("RTL_STORAGE_DIR", "")
 STORAGE_DIR: Path = Path(_storage_env) if _storage_env else ROOT / "spaces_app" / "storage"
@@ -40,6 +56,16 @@ DB_PATH: Path = Path(_db_env) if _db_env else STORAGE_DIR / "rtl.db"
 RUNS_DIR: Path = STORAGE_DIR / "outputs" / "runs"
 BATCHES_DIR: Path = STORAGE_DIR / "outputs" / "batches"
 
+# Content-addressed cache of audit results and individual model calls for
+# identical inputs (opt-in)
+RTL_RESULT_CACHE: bool = os.getenv("RTL_RESULT_CACHE", "false").lower() in ("1", "true")
+RESULT_CACHE_DIR: Path = STORAGE_DIR / "outputs" / "cache"
+INFER_CACHE_DIR: Path = RESULT_CACHE_DIR / "infer"
+
+# ── Auth ───────────────────────────────────────────────────────────────────
+# bcrypt cost factor for new password hashes; lower (min 4) only for tests/CI
+BCRYPT_ROUNDS: int = int(os.getenv("RTL_BCRYPT_ROUNDS", "12"))
+
 # ── Examples ────────────────────────────────────────────────────────────────
 EXAMPLES_DIR: Path = ROOT / "spaces_app" / "ui" / "data" / "examples"
 MOCK_RESULTS_PATH: Path = ROOT / "eval" / "sample_outputs" / "mock_results.json"
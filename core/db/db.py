@@ -1,28 +1,155 @@
 """Thread-safe SQLite connection management."""
+import queue
 import sqlite3
 import threading
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
 
-_local = threading.local()
+POOL_SIZE = 8
 
 
-def get_conn(db_path: Path) -> sqlite3.Connection:
-    """Return a thread-local connection to the SQLite database."""
-    key = str(db_path)
-    conn = getattr(_local, key, None)
-    if conn is None:
-        conn = sqlite3.connect(str(db_path), check_same_thread=False)
+class ConnPool:
+    """Bounded pool of SQLite connections shared by all threads."""
+
+    def __init__(self, db_path: Path, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
         conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
         conn.execute("PRAGMA foreign_keys=ON")
-        setattr(_local, key, conn)
-    return conn
+        # Pooled connections live for the whole process, so give each a bigger
+        # page cache (~20 MB), in-memory temp tables and memory-mapped reads
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def acquire(self) -> Iterator[sqlite3.Connection]:
+        """Lease a connection, returning it to the pool when the block exits."""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools: dict[str, ConnPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Path) -> ConnPool:
+    """Return the process-wide connection pool for a database file."""
+    key = str(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnPool(db_path)
+    return pool
+
+
+@contextmanager
+def get_conn(db_path: Path) -> Iterator[sqlite3.Connection]:
+    """Lease a pooled connection to the SQLite database for the duration of the block."""
+    with get_pool(db_path).acquire() as conn:
+        yield conn
+
+
+def close_pool(db_path: Path) -> None:
+    """Close and forget the pool for a database file (e.g. before deleting it)."""
+    with _pools_lock:
+        pool = _pools.pop(str(db_path), None)
+    if pool is not None:
+        pool.close()
+
+
+@contextmanager
+def tx(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Commit all writes made inside the block as one transaction, rolling back on error."""
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
 
 def init_db(db_path: Path, schema_path: Path) -> None:
     """Create tables from schema SQL if they don't exist."""
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    conn = get_conn(db_path)
+    with get_conn(db_path) as conn:
+        init_schema(conn, schema_path)
+
+
+def init_schema(conn: sqlite3.Connection, schema_path: Path) -> None:
+    """Apply schema SQL (after migrating older tables) on an open connection, e.g. an in-memory DB."""
+    _migrate(conn)
     with open(schema_path, "r", encoding="utf-8") as f:
         conn.executescript(f.read())
+    # Refresh planner statistics so the indexes above are used
+    conn.execute("PRAGMA optimize")
     conn.commit()
+
+
+# Columns added to existing tables after their first release: (table, column, DDL type)
+_ADDED_COLUMNS = [
+    ("runs", "fc_supported", "INTEGER NOT NULL DEFAULT 0"),
+    ("runs", "fc_uncertain", "INTEGER NOT NULL DEFAULT 0"),
+    ("runs", "fc_needs_review", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Bring tables created by an older schema.sql up to date."""
+    existing: dict[str, set[str]] = {}
+    added = []
+    for table, column, ddl in _ADDED_COLUMNS:
+        if table not in existing:
+            existing[table] = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if existing[table] and column not in existing[table]:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+            added.append(column)
+    if "fc_supported" in added:
+        # Backfill the integer flag counts from the JSON column
+        conn.execute(
+            """UPDATE runs SET
+               fc_supported=COALESCE(json_extract(flag_counts_json, '$.supported'), 0),
+               fc_uncertain=COALESCE(json_extract(flag_counts_json, '$.uncertain'), 0),
+               fc_needs_review=COALESCE(json_extract(flag_counts_json, '$.needs_review'), 0)"""
+        )
@@ -1,9 +1,15 @@
-"""CRUD operations for all tables: users, runs, batches, batch_runs, audit_events."""
-import json
+"""
+CRUD operations for all tables: users, runs, batches, batch_runs, audit_events.
+
+Write helpers do not commit; callers group related writes with
+``core.db.db.tx`` so they land in a single transaction.
+"""
 import sqlite3
 import bcrypt
+import orjson
 from typing import Optional
 
+from core import config
 from core.util.ids import new_user_id, new_run_id, new_batch_id, new_event_id
 from core.util.time import utcnow_iso
 
@@ -13,17 +19,21 @@ from core.util.time import utcnow_iso
 def create_user(conn: sqlite3.Connection, email: str, display_name: str, password: str) -> str:
     """Create a new user account and return the generated user_id."""
     user_id = new_user_id()
-    pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)).decode()
     conn.execute(
         "INSERT INTO users (user_id, email, display_name, password_hash, created_at) VALUES (?,?,?,?,?)",
         (user_id, email, display_name, pw_hash, utcnow_iso()),
     )
-    conn.commit()
     return user_id
 
 
 def authenticate_user(conn: sqlite3.Connection, email: str, password: str) -> Optional[str]:
-    """Verify credentials and return user_id on success, None on failure."""
+    """
+    Verify credentials and return user_id on success, None on failure.
+
+    bcrypt verification is deliberately slow (~250 ms at the default cost);
+    async callers should dispatch this via asyncio.to_thread or an executor.
+    """
     row = conn.execute("SELECT user_id, password_hash FROM users WHERE email=?", (email,)).fetchone()
     if row is None:
         return None
@@ -40,6 +50,25 @@ def get_user_display_name(conn: sqlite3.Connection, user_id: str) -> Optional[st
 
 # ─────────────────────────────── RUNS ─────────────────────────────────────
 
+# Columns returned by run queries; flag counts are read from their integer
+# columns rather than by parsing flag_counts_json.
+_RUN_COLUMNS = (
+    "run_id, user_id, created_at, input_image_hash, input_report_hash, case_label, "
+    "model_name, model_version, lora_id, prompt_version, overall_score, severity, "
+    "fc_supported, fc_uncertain, fc_needs_review, status, error_message, results_path"
+)
+
+
+def _run_dict(row: sqlite3.Row) -> dict:
+    d = dict(row)
+    d["flag_counts"] = {
+        "supported": d.pop("fc_supported"),
+        "uncertain": d.pop("fc_uncertain"),
+        "needs_review": d.pop("fc_needs_review"),
+    }
+    return d
+
+
 def create_run(
     conn: sqlite3.Connection,
     *,
@@ -64,27 +93,26 @@ def create_run(
         """INSERT INTO runs
         (run_id, user_id, created_at, input_image_hash, input_report_hash,
          case_label, model_name, model_version, lora_id, prompt_version,
-         overall_score, severity, flag_counts_json, status, error_message, results_path)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+         overall_score, severity, flag_counts_json,
+         fc_supported, fc_uncertain, fc_needs_review,
+         status, error_message, results_path)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
         (
             run_id, user_id, utcnow_iso(), image_hash, report_hash,
             case_label, model_name, model_version, lora_id or "", prompt_version,
-            overall_score, severity, json.dumps(flag_counts),
+            overall_score, severity, orjson.dumps(flag_counts).decode(),
+            flag_counts.get("supported", 0), flag_counts.get("uncertain", 0),
+            flag_counts.get("needs_review", 0),
             status, error_message or "", results_path,
         ),
     )
-    conn.commit()
     return run_id
 
 
 def get_run(conn: sqlite3.Connection, run_id: str) -> Optional[dict]:
     """Fetch a single run by ID, returning None if not found."""
-    row = conn.execute("SELECT * FROM runs WHERE run_id=?", (run_id,)).fetchone()
-    if row is None:
-        return None
-    d = dict(row)
-    d["flag_counts"] = json.loads(d.pop("flag_counts_json"))
-    return d
+    row = conn.execute(f"SELECT {_RUN_COLUMNS} FROM runs WHERE run_id=?", (run_id,)).fetchone()
+    return _run_dict(row) if row is not None else None
 
 
 def list_recent_runs_for_user(conn: sqlite3.Connection, user_id: str, limit: int = 20) -> list:
@@ -100,14 +128,9 @@ def list_recent_runs_for_user(conn: sqlite3.Connection, user_id: str, limit: int
 def list_all_runs_for_user(conn: sqlite3.Connection, user_id: str) -> list[dict]:
     """Return all runs for a user as fully parsed dicts."""
     rows = conn.execute(
-        "SELECT * FROM runs WHERE user_id=? ORDER BY created_at DESC", (user_id,)
+        f"SELECT {_RUN_COLUMNS} FROM runs WHERE user_id=? ORDER BY created_at DESC", (user_id,)
     ).fetchall()
-    result = []
-    for row in rows:
-        d = dict(row)
-        d["flag_counts"] = json.loads(d.pop("flag_counts_json"))
-        result.append(d)
-    return result
+    return [_run_dict(row) for row in rows]
 
 
 # ─────────────────────────────── BATCHES ──────────────────────────────────
@@ -128,7 +151,6 @@ def create_batch(
         VALUES (?,?,?,?,?,0,0,'{}','running')""",
         (batch_id, user_id, utcnow_iso(), zip_name, num_cases_total),
     )
-    conn.commit()
     return batch_id
 
 
@@ -144,9 +166,8 @@ def update_batch_progress(
     conn.execute(
         """UPDATE batches SET num_cases_done=?, num_cases_failed=?,
            batch_summary_json=?, status=? WHERE batch_id=?""",
-        (num_done, num_failed, json.dumps(summary), status, batch_id),
+        (num_done, num_failed, orjson.dumps(summary).decode(), status, batch_id),
     )
-    conn.commit()
 
 
 def link_batch_run(conn: sqlite3.Connection, batch_id: str, run_id: str, case_id: str) -> None:
@@ -155,7 +176,14 @@ def link_batch_run(conn: sqlite3.Connection, batch_id: str, run_id: str, case_id
         "INSERT OR IGNORE INTO batch_runs (batch_id, run_id, case_id) VALUES (?,?,?)",
         (batch_id, run_id, case_id),
     )
-    conn.commit()
+
+
+def link_batch_runs_bulk(conn: sqlite3.Connection, batch_id: str, pairs: list[tuple[str, str]]) -> None:
+    """Associate many (run_id, case_id) pairs with their parent batch in one statement."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO batch_runs (batch_id, run_id, case_id) VALUES (?,?,?)",
+        [(batch_id, run_id, case_id) for run_id, case_id in pairs],
+    )
 
 
 def get_batch(conn: sqlite3.Connection, batch_id: str) -> Optional[dict]:
@@ -164,24 +192,20 @@ def get_batch(conn: sqlite3.Connection, batch_id: str) -> Optional[dict]:
     if row is None:
         return None
     d = dict(row)
-    d["batch_summary"] = json.loads(d.pop("batch_summary_json"))
+    d["batch_summary"] = orjson.loads(d.pop("batch_summary_json"))
     return d
 
 
 def list_batch_runs(conn: sqlite3.Connection, batch_id: str) -> list[dict]:
     """Return all runs belonging to a batch, joined with case_id."""
+    run_columns = ", ".join(f"r.{c.strip()}" for c in _RUN_COLUMNS.split(","))
     rows = conn.execute(
-        """SELECT r.*, br.case_id FROM runs r
+        f"""SELECT {run_columns}, br.case_id FROM runs r
            JOIN batch_runs br ON r.run_id=br.run_id
            WHERE br.batch_id=? ORDER BY r.created_at""",
         (batch_id,),
     ).fetchall()
-    result = []
-    for row in rows:
-        d = dict(row)
-        d["flag_counts"] = json.loads(d.pop("flag_counts_json"))
-        result.append(d)
-    return result
+    return [_run_dict(row) for row in rows]
 
 
 # ─────────────────────────── AUDIT EVENTS ────────────────────────────────
@@ -197,9 +221,8 @@ def log_event(
     event_id = new_event_id()
     conn.execute(
         "INSERT INTO audit_events (event_id, run_id, timestamp, actor, event_type, details_json) VALUES (?,?,?,?,?,?)",
-        (event_id, run_id, utcnow_iso(), actor, event_type, json.dumps(details)),
+        (event_id, run_id, utcnow_iso(), actor, event_type, orjson.dumps(details).decode()),
     )
-    conn.commit()
     return event_id
 
 
@@ -211,6 +234,6 @@ def list_events_for_run(conn: sqlite3.Connection, run_id: str) -> list[dict]:
     result = []
     for row in rows:
         d = dict(row)
-        d["details"] = json.loads(d.pop("details_json"))
+        d["details"] = orjson.loads(d.pop("details_json"))
         result.append(d)
     return result
@@ -24,6 +24,9 @@ CREATE TABLE IF NOT EXISTS runs (
   severity TEXT NOT NULL,
 
   flag_counts_json TEXT NOT NULL,
+  fc_supported INTEGER NOT NULL DEFAULT 0,
+  fc_uncertain INTEGER NOT NULL DEFAULT 0,
+  fc_needs_review INTEGER NOT NULL DEFAULT 0,
   status TEXT NOT NULL,
   error_message TEXT,
 
@@ -66,3 +69,13 @@ CREATE TABLE IF NOT EXISTS audit_events (
   details_json TEXT NOT NULL,
   FOREIGN KEY (run_id) REFERENCES runs(run_id)
 );
+
+-- Covers list_recent_runs_for_user without touching the table rows
+CREATE INDEX IF NOT EXISTS idx_runs_user_created
+  ON runs(user_id, created_at DESC, case_label, overall_score, severity, run_id);
+
+-- The batch_runs primary key already indexes (batch_id, run_id); this adds case_id
+-- so list_batch_runs can read the link table from the index alone
+CREATE INDEX IF NOT EXISTS idx_batch_runs_batch ON batch_runs(batch_id, run_id, case_id);
+
+CREATE INDEX IF NOT EXISTS idx_events_run_ts ON audit_events(run_id, timestamp);
@@ -9,19 +9,27 @@ Runs the full 6-step pipeline:
   5. Clinician summary (text + scoring)
   6. Patient explanation (text)
 
+Steps 1 and 2 run concurrently since neither depends on the other, and
+steps 4 and 6 run concurrently with the clinician summary, which only
+depends on scoring.
+
 Returns a fully structured AuditResult dict and persists it to disk.
 """
-import json
+import contextvars
+import functools
 import logging
+import string
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
+import orjson
 from PIL import Image
 
 from core import config
 from core.pipeline import medgemma_client as mgc
 from core.scoring.score import compute_score
-from core.util.files import write_json, read_text
+from core.util.files import write_json, read_json, read_text
 from core.util.hashing import hash_image, hash_string
 from core.util.ids import new_run_id
 from core.util.time import utcnow_iso
@@ -31,11 +39,59 @@ logger = logging.getLogger(__name__)
 SCHEMAS = config.SCHEMAS_DIR
 PROMPTS = config.PROMPTS_DIR
 
+_hash_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rtl-hash")
+
+
+@functools.lru_cache(maxsize=None)
+def _prompt_template(name: str) -> str:
+    """Read a prompt template once; templates are static for the process lifetime."""
+    return read_text(PROMPTS / f"{name}.md")
+
+
+@functools.lru_cache(maxsize=None)
+def _schema_text(name: str) -> str:
+    """Read a JSON schema file once for embedding into prompts."""
+    return read_text(SCHEMAS / f"{name}.schema.json")
+
+
+@functools.lru_cache(maxsize=None)
+def _prompt_parts(name: str) -> tuple[tuple[str, Optional[str], str], ...]:
+    """Parse a template's str.format fields once into (literal, field, format_spec) parts."""
+    return tuple(
+        (literal, field, spec or "")
+        for literal, field, spec, _conv in string.Formatter().parse(_prompt_template(name))
+    )
+
 
 def _load_prompt(name: str, **kwargs) -> str:
-    path = PROMPTS / f"{name}.md"
-    template = read_text(path)
-    return template.format(**kwargs)
+    out = []
+    for literal, field, spec in _prompt_parts(name):
+        out.append(literal)
+        if field is not None:
+            out.append(format(kwargs[field], spec))
+    return "".join(out)
+
+
+def _dump(obj, indent: bool = True) -> str:
+    """Serialize an object for embedding into a prompt."""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+
+
+def _cache_path(image_hash: str, report_hash: str, lora_id: str) -> Path:
+    """Location of the cached result for these inputs under the current model/prompt config."""
+    key = hash_string(":".join([
+        image_hash, report_hash, config.RTL_PROMPT_VERSION,
+        config.MEDGEMMA_INFERENCE_MODE, config.MEDGEMMA_MODEL_ID, lora_id, str(config.MEDGEMMA_MOCK),
+    ]))
+    return config.RESULT_CACHE_DIR / key[:2] / f"{key[2:]}.json"
+
+
+def _persist(result: dict) -> dict:
+    """Write a result to its run directory and record the path on the result."""
+    results_path = config.RUNS_DIR / result["run_id"] / "results.json"
+    write_json(results_path, result)
+    result["results_path"] = str(results_path)
+    return result
 
 
 def run_audit(
@@ -62,6 +118,26 @@ def run_audit(
     total_steps = 6
     errors: list[str] = []
     schema_repairs: list[str] = []
+    # Hash the image off the critical path; only the result cache needs it up front
+    image_hash_future = _hash_pool.submit(hash_image, image)
+    report_hash = hash_string(report_text)
+    effective_lora = lora_id or config.RTL_LORA_ID
+
+    cache_path = None
+    if config.RTL_RESULT_CACHE:
+        cache_path = _cache_path(image_hash_future.result(), report_hash, effective_lora)
+    if cache_path is not None and cache_path.exists():
+        try:
+            result = read_json(cache_path)
+        except (OSError, ValueError):
+            logger.warning("[%s] Ignoring unreadable cache entry %s", run_id, cache_path)
+        else:
+            result.update(run_id=run_id, created_at=utcnow_iso(), case_label=case_label)
+            result.pop("results_path", None)
+            logger.info("[%s] Cache hit — reusing audit result", run_id)
+            if progress_cb:
+                progress_cb(total_steps, total_steps, "Loaded cached audit result")
+            return _persist(result)
 
     # Set mock context so mock mode returns case-specific results
     mgc.set_mock_context(report_text)
@@ -71,36 +147,43 @@ def run_audit(
         if progress_cb:
             progress_cb(step, total_steps, msg)
 
-    # ── Step 1: Claim extraction ─────────────────────────────────────────
-    progress(1, "Extracting claims from report...")
-    prompt = _load_prompt(
-        "claim_extraction",
-        report_text=report_text,
-        schema=read_text(SCHEMAS / "claim_extraction.schema.json"),
-    )
-    claims_result, errs = mgc.infer_structured(
-        prompt=prompt,
-        schema_path=SCHEMAS / "claim_extraction.schema.json",
-        image=None,
-        task_name="claim_extraction",
-    )
-    if errs:
-        errors.extend(errs)
-        schema_repairs.append("claim_extraction")
-    claims = claims_result.get("claims", [])
-
-    # ── Step 2: Image findings ────────────────────────────────────────────
-    progress(2, "Analyzing image for visual findings...")
-    prompt = _load_prompt(
+    # ── Steps 1+2: Claim extraction and image findings ──────────────────
+    # The two steps are independent, so image findings run on a helper thread
+    # while claims are extracted here.
+    findings_prompt = _load_prompt(
         "image_findings",
-        schema=read_text(SCHEMAS / "image_findings.schema.json"),
-    )
-    findings_result, errs = mgc.infer_structured(
-        prompt=prompt,
-        schema_path=SCHEMAS / "image_findings.schema.json",
-        image=image,
-        task_name="image_findings",
+        schema=_schema_text("image_findings"),
     )
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        findings_future = ex.submit(
+            contextvars.copy_context().run,
+            mgc.infer_structured,
+            prompt=findings_prompt,
+            schema_path=SCHEMAS / "image_findings.schema.json",
+            image=image,
+            task_name="image_findings",
+        )
+
+        progress(1, "Extracting claims from report...")
+        prompt = _load_prompt(
+            "claim_extraction",
+            report_text=report_text,
+            schema=_schema_text("claim_extraction"),
+        )
+        claims_result, errs = mgc.infer_structured(
+            prompt=prompt,
+            schema_path=SCHEMAS / "claim_extraction.schema.json",
+            image=None,
+            task_name="claim_extraction",
+        )
+        if errs:
+            errors.extend(errs)
+            schema_repairs.append("claim_extraction")
+        claims = claims_result.get("claims", [])
+
+        progress(2, "Analyzing image for visual findings...")
+        findings_result, errs = findings_future.result()
+
     if errs:
         errors.extend(errs)
         schema_repairs.append("image_findings")
@@ -111,9 +194,9 @@ def run_audit(
     progress(3, "Aligning report claims to image evidence...")
     prompt = _load_prompt(
         "alignment",
-        claims_json=json.dumps(claims, indent=2),
-        findings_json=json.dumps(findings, indent=2),
-        schema=read_text(SCHEMAS / "alignment.schema.json"),
+        claims_json=_dump(claims),
+        findings_json=_dump(findings),
+        schema=_schema_text("alignment"),
     )
     alignment_result, errs = mgc.infer_structured(
         prompt=prompt,
@@ -136,61 +219,68 @@ def run_audit(
     progress(4, "Computing safety score...")
     overall_score, severity, flag_counts = compute_score(alignments)
 
-    # ── Step 5: Rewrite suggestions ───────────────────────────────────────
+    # ── Step 5: Rewrite suggestions + clinician summary ──────────────────
+    # The summary only depends on scoring, so it runs on a helper thread while
+    # the rewrite and patient explanation (which depends on the rewrite) run here.
     progress(5, "Generating rewrite suggestions...")
     flagged = [a for a in alignments if a.get("label") in ("uncertain", "needs_review")]
-    prompt = _load_prompt(
-        "rewrite",
-        report_text=report_text,
-        alignment_json=json.dumps(flagged, indent=2),
-        schema=read_text(SCHEMAS / "rewrite.schema.json"),
-    )
-    rewrite_result, errs = mgc.infer_structured(
-        prompt=prompt,
-        schema_path=SCHEMAS / "rewrite.schema.json",
-        image=None,
-        task_name="rewrite",
-    )
-    if errs:
-        errors.extend(errs)
-        schema_repairs.append("rewrite")
-
-    # ── Step 5b: Clinician summary ────────────────────────────────────────
-    flagged_claims = [a for a in alignments if a.get("label") in ("uncertain", "needs_review")]
-    prompt = _load_prompt(
+    flagged_json = _dump(flagged)
+    summary_prompt = _load_prompt(
         "clinician_summary",
         overall_score=overall_score,
         severity=severity,
-        flag_counts_json=json.dumps(flag_counts),
-        flagged_claims_json=json.dumps(flagged_claims, indent=2),
-        schema=read_text(SCHEMAS / "clinician_summary.schema.json"),
-    )
-    summary_result, errs = mgc.infer_structured(
-        prompt=prompt,
-        schema_path=SCHEMAS / "clinician_summary.schema.json",
-        image=None,
-        task_name="clinician_summary",
+        flag_counts_json=_dump(flag_counts, indent=False),
+        flagged_claims_json=flagged_json,
+        schema=_schema_text("clinician_summary"),
     )
-    if errs:
-        errors.extend(errs)
-        schema_repairs.append("clinician_summary")
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        summary_future = ex.submit(
+            contextvars.copy_context().run,
+            mgc.infer_structured,
+            prompt=summary_prompt,
+            schema_path=SCHEMAS / "clinician_summary.schema.json",
+            image=None,
+            task_name="clinician_summary",
+        )
+
+        prompt = _load_prompt(
+            "rewrite",
+            report_text=report_text,
+            alignment_json=flagged_json,
+            schema=_schema_text("rewrite"),
+        )
+        rewrite_result, errs = mgc.infer_structured(
+            prompt=prompt,
+            schema_path=SCHEMAS / "rewrite.schema.json",
+            image=None,
+            task_name="rewrite",
+        )
+        if errs:
+            errors.extend(errs)
+            schema_repairs.append("rewrite")
+
+        # ── Step 6: Patient explanation ───────────────────────────────────
+        progress(6, "Generating patient-friendly explanation...")
+        edited_report = rewrite_result.get("edited_report", report_text)
+        prompt = _load_prompt(
+            "patient_explain",
+            report_text=edited_report,
+            schema=_schema_text("patient_explain"),
+        )
+        patient_result, patient_errs = mgc.infer_structured(
+            prompt=prompt,
+            schema_path=SCHEMAS / "patient_explain.schema.json",
+            image=None,
+            task_name="patient_explain",
+        )
+
+        summary_result, errs = summary_future.result()
 
-    # ── Step 6: Patient explanation ───────────────────────────────────────
-    progress(6, "Generating patient-friendly explanation...")
-    edited_report = rewrite_result.get("edited_report", report_text)
-    prompt = _load_prompt(
-        "patient_explain",
-        report_text=edited_report,
-        schema=read_text(SCHEMAS / "patient_explain.schema.json"),
-    )
-    patient_result, errs = mgc.infer_structured(
-        prompt=prompt,
-        schema_path=SCHEMAS / "patient_explain.schema.json",
-        image=None,
-        task_name="patient_explain",
-    )
     if errs:
         errors.extend(errs)
+        schema_repairs.append("clinician_summary")
+    if patient_errs:
+        errors.extend(patient_errs)
         schema_repairs.append("patient_explain")
 
     # ── Assemble result ───────────────────────────────────────────────────
@@ -200,11 +290,11 @@ def run_audit(
         "case_label": case_label,
         "model_name": "medgemma",
         "model_version": config.MEDGEMMA_MODEL_ID,
-        "lora_id": lora_id or config.RTL_LORA_ID,
+        "lora_id": effective_lora,
         "prompt_version": config.RTL_PROMPT_VERSION,
         "mock_mode": config.MEDGEMMA_MOCK,
-        "image_hash": hash_image(image),
-        "report_hash": hash_string(report_text),
+        "image_hash": image_hash_future.result(),
+        "report_hash": report_hash,
         "original_report": report_text,
         "claims": claims,
         "findings": findings,
@@ -222,11 +312,11 @@ def run_audit(
     }
 
     # ── Persist to disk ───────────────────────────────────────────────────
-    run_dir = config.RUNS_DIR / run_id
-    run_dir.mkdir(parents=True, exist_ok=True)
-    results_path = run_dir / "results.json"
-    write_json(results_path, result)
-    result["results_path"] = str(results_path)
+    # Results with fallback steps are never cached, so a transient failure isn't replayed
+    if cache_path is not None and not errors:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(cache_path, result)
+    _persist(result)
 
     logger.info("[%s] Audit complete. Score=%d Severity=%s", run_id, overall_score, severity)
     return result
@@ -8,6 +8,7 @@ Computes a 0-100 score from alignment labels using a penalty-based system:
 
 Severity classification: low (>= 80), medium (>= 50), high (< 50).
 """
+from collections import Counter
 from typing import Literal
 
 Label = Literal["supported", "uncertain", "needs_review"]
@@ -29,15 +30,11 @@ def compute_score(claims: list[dict]) -> tuple[int, str, dict]:
     if not claims:
         return 100, "low", {"supported": 0, "uncertain": 0, "needs_review": 0}
 
-    counts: dict[str, int] = {k: 0 for k in PENALTY}
-    total_penalty = 0
-
-    for claim in claims:
-        label = claim.get("label", "uncertain")
-        if label not in PENALTY:
-            label = "uncertain"
-        counts[label] += 1
-        total_penalty += PENALTY[label]
+    tally = Counter(claim.get("label", "uncertain") for claim in claims)
+    # Unknown labels count as uncertain
+    counts: dict[str, int] = {k: tally.pop(k, 0) for k in PENALTY}
+    counts["uncertain"] += sum(tally.values())
+    total_penalty = sum(PENALTY[k] * n for k, n in counts.items())
 
     max_possible = PENALTY["needs_review"] * len(claims)
     if max_possible == 0:
@@ -1,8 +1,12 @@
 """File I/O helpers for run outputs."""
-import json
+import mmap
+import os
 import shutil
+import threading
 from pathlib import Path
 
+import orjson
+
 
 def ensure_dir(path: Path) -> Path:
     """Create directory (and parents) if it doesn't exist, then return the path."""
@@ -11,22 +15,42 @@ def ensure_dir(path: Path) -> Path:
 
 
 def write_json(path: Path, data: dict) -> None:
-    """Write a dict as pretty-printed JSON, creating parent directories as needed."""
+    """
+    Write a dict as pretty-printed JSON, creating parent directories as needed.
+
+    The file is written to a temp file beside the target in a single write and
+    renamed into place, so readers never see a partially written file.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+# Files at least this large are parsed straight from a memory map instead of
+# being read into an intermediate bytes object first
+_MMAP_MIN_BYTES = 1 << 20
+
+
+def _parse_file(path: Path, parse):
+    """Apply parse to a file's contents, mmap-backed for large files."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < _MMAP_MIN_BYTES:
+            return parse(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return parse(view)
 
 
 def read_json(path: Path) -> dict:
     """Read and parse a JSON file."""
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return _parse_file(path, orjson.loads)
 
 
 def read_text(path: Path) -> str:
     """Read a file as UTF-8 text."""
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+    return _parse_file(path, lambda buf: str(buf, "utf-8"))
 
 
 def copy_file(src: Path, dst: Path) -> None:
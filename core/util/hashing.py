@@ -5,9 +5,9 @@ from pathlib import Path
 
 def hash_bytes(data: bytes, algo: str = "sha256") -> str:
     """Return hex digest of raw bytes using the given hash algorithm."""
-    h = hashlib.new(algo)
-    h.update(data)
-    return h.hexdigest()
+    if algo == "sha256":
+        return hashlib.sha256(data).hexdigest()
+    return hashlib.new(algo, data).hexdigest()
 
 
 def hash_string(text: str) -> str:
@@ -16,17 +16,25 @@ def hash_string(text: str) -> str:
 
 
 def hash_file(path: Path) -> str:
-    """Return SHA-256 hex digest of a file, read in 64KB chunks."""
-    h = hashlib.sha256()
+    """Return SHA-256 hex digest of a file, hashed in C via hashlib.file_digest on 3.11+."""
     with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
         for chunk in iter(lambda: f.read(65536), b""):
             h.update(chunk)
-    return h.hexdigest()
+        return h.hexdigest()
 
 
 def hash_image(pil_image) -> str:
-    """Hash a PIL Image by its raw bytes."""
-    import io
-    buf = io.BytesIO()
-    pil_image.save(buf, format="PNG")
-    return hash_bytes(buf.getvalue())
+    """
+    Hash a PIL Image by its raw pixel buffer.
+
+    Mode and size are hashed ahead of the pixels so different layouts of the
+    same bytes never collide; palette images include their palette.
+    """
+    h = hashlib.sha256(f"{pil_image.mode}:{pil_image.size[0]}x{pil_image.size[1]}|".encode())
+    if pil_image.mode in ("P", "PA"):
+        h.update(bytes(pil_image.getpalette() or ()))
+    h.update(pil_image.tobytes())
+    return h.hexdigest()
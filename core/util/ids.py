@@ -1,12 +1,39 @@
 """Unique ID generation for runs, batches, events, and users."""
-import uuid
+import os
+import threading
 import time
 
+# Random suffixes are sliced from a pooled os.urandom() buffer, so generating
+# many IDs (e.g. audit events) costs one urandom syscall per 4 KiB.
+_RAND_POOL_SIZE = 4096
+_SUFFIX_BYTES = 6  # 12 hex chars
+_rand_pool = bytearray()
+_rand_lock = threading.Lock()
+
+
+def _reset_pool_after_fork() -> None:
+    # A forked child must not hand out the parent's remaining random bytes
+    global _rand_lock
+    _rand_pool.clear()
+    _rand_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def _random_suffix() -> str:
+    with _rand_lock:
+        if len(_rand_pool) < _SUFFIX_BYTES:
+            _rand_pool.extend(os.urandom(_RAND_POOL_SIZE))
+        out = _rand_pool[:_SUFFIX_BYTES].hex()
+        del _rand_pool[:_SUFFIX_BYTES]
+    return out
+
 
 def new_id(prefix: str = "") -> str:
     """Return a collision-resistant ID with an optional prefix."""
     ts = int(time.time() * 1000)
-    uid = uuid.uuid4().hex[:12]
+    uid = _random_suffix()
     if prefix:
         return f"{prefix}_{ts}_{uid}"
     return f"{ts}_{uid}"
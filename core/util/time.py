@@ -1,4 +1,5 @@
 """Timestamp helpers."""
+import functools
 from datetime import datetime, timezone
 
 
@@ -7,8 +8,9 @@ def utcnow_iso() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
+@functools.lru_cache(maxsize=4096)
 def fmt_display(iso: str) -> str:
-    """Convert ISO timestamp to human-readable display format."""
+    """Convert ISO timestamp to human-readable display format (memoized; tables repeat timestamps)."""
     try:
         dt = datetime.fromisoformat(iso.replace("Z", "+00:00"))
         return dt.strftime("%b %d, %Y %H:%M UTC")
@@ -5,50 +5,97 @@ Provides functions to validate structured outputs against JSON schemas
 and extract JSON objects from free-text model responses (handles markdown
 code fences, embedded JSON, and raw JSON strings).
 """
+import functools
 import json
 import re
 import jsonschema
+import orjson
 from pathlib import Path
 
 
+@functools.lru_cache(maxsize=32)
 def load_schema(schema_path: Path) -> dict:
-    with open(schema_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Load a JSON schema once per path; the returned dict is shared, so don't mutate it."""
+    return orjson.loads(schema_path.read_bytes())
+
+
+def _build_validator(schema: dict) -> jsonschema.protocols.Validator:
+    """Check a schema once and build a reusable validator for it."""
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
+@functools.lru_cache(maxsize=32)
+def _validator(schema_path: Path) -> jsonschema.protocols.Validator:
+    return _build_validator(load_schema(schema_path))
+
+
+@functools.lru_cache(maxsize=64)
+def _validator_for_key(schema_key: bytes) -> jsonschema.protocols.Validator:
+    return _build_validator(orjson.loads(schema_key))
+
+
+def _errors(validator: jsonschema.protocols.Validator, data: dict) -> list[str]:
+    error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+    return [error.message] if error is not None else []
 
 
 def validate(data: dict, schema: dict) -> list[str]:
     """Return list of validation error messages, empty if valid."""
     try:
-        jsonschema.validate(instance=data, schema=schema)
-        return []
-    except jsonschema.ValidationError as e:
-        return [e.message]
+        # Schemas are keyed by their canonical encoding, since dicts aren't hashable
+        validator = _validator_for_key(orjson.dumps(schema, option=orjson.OPT_SORT_KEYS))
     except jsonschema.SchemaError as e:
         return [f"Schema error: {e.message}"]
+    return _errors(validator, data)
+
+
+def validate_against(data: dict, schema_path: Path) -> list[str]:
+    """Like validate(), but reuses a cached validator for the schema file."""
+    try:
+        validator = _validator(schema_path)
+    except jsonschema.SchemaError as e:
+        return [f"Schema error: {e.message}"]
+    return _errors(validator, data)
+
+
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+_raw_decoder = json.JSONDecoder()
 
 
 def extract_json_from_text(text: str) -> dict | None:
     """Try to extract the first JSON object from a string."""
     # Try direct parse
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
         pass
 
-    # Find JSON block between ```json ... ```
-    match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(1))
-        except json.JSONDecodeError:
-            pass
+    # Find JSON block between ```json ... ``` (regex only runs once a fence is found)
+    fence = text.find("```")
+    if fence >= 0:
+        match = _JSON_FENCE_RE.search(text, fence)
+        if match:
+            try:
+                return orjson.loads(match.group(1))
+            except orjson.JSONDecodeError:
+                pass
+
+    start = text.find("{")
+    if start < 0:
+        return None
 
-    # Find first { ... } block
-    match = re.search(r"\{.*\}", text, re.DOTALL)
-    if match:
+    # Outermost { ... } span
+    end = text.rfind("}")
+    if end > start:
         try:
-            return json.loads(match.group(0))
-        except json.JSONDecodeError:
+            return orjson.loads(text[start:end + 1])
+        except orjson.JSONDecodeError:
             pass
 
-    return None
+    # First complete object, ignoring whatever trails it
+    try:
+        return _raw_decoder.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        return None
@@ -1,7 +1,23 @@
 """Format synthetic JSONL pairs into chat-template format for MedGemma fine-tuning."""
-import json
 from pathlib import Path
 
+import orjson
+
+# Lines are small, so read and write through 64 KiB buffers to keep syscalls rare
+_BUFFER_SIZE = 1 << 16
+
+
+def _escaped(text: str) -> bytes:
+    """JSON-escaped interior of a string literal (without the surrounding quotes)."""
+    return orjson.dumps(text)[1:-1]
+
+
+# Each output line is {"text": "<user turn>{prompt}<model turn>{completion}<end>"};
+# the fixed parts are pre-encoded so only prompt/completion are escaped per line.
+_LINE_HEAD = b'{"text":"' + _escaped("<start_of_turn>user\n")
+_LINE_MID = _escaped("<end_of_turn>\n<start_of_turn>model\n")
+_LINE_TAIL = _escaped("<end_of_turn>") + b'"}\n'
+
 
 def format_for_chat(input_path: Path, output_path: Path, model_id: str = "google/medgemma-4b-it") -> None:
     """
@@ -10,16 +26,13 @@ def format_for_chat(input_path: Path, output_path: Path, model_id: str = "google
     """
     output_path.parent.mkdir(parents=True, exist_ok=True)
     count = 0
-    with open(input_path) as fin, open(output_path, "w") as fout:
+    with open(input_path, "rb", buffering=_BUFFER_SIZE) as fin, \
+            open(output_path, "wb", buffering=_BUFFER_SIZE) as fout:
         for line in fin:
-            pair = json.loads(line.strip())
+            pair = orjson.loads(line)
             prompt = pair.get("prompt", pair.get("input", ""))
             completion = pair.get("completion", pair.get("output", ""))
-            text = (
-                f"<start_of_turn>user\n{prompt}<end_of_turn>\n"
-                f"<start_of_turn>model\n{completion}<end_of_turn>"
-            )
-            fout.write(json.dumps({"text": text}) + "\n")
+            fout.write(b"".join((_LINE_HEAD, _escaped(prompt), _LINE_MID, _escaped(completion), _LINE_TAIL)))
             count += 1
     print(f"Formatted {count} pairs → {output_path}")
 
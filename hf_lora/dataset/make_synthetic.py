@@ -9,19 +9,23 @@ Uses MedGemma itself (via mock data) + hand-crafted augmentations.
 All data is synthetic — no PHI.
 """
 import json
-import random
 from pathlib import Path
 
+import numpy as np
+import orjson
+
 OUTPUT_DIR = Path(__file__).parent
 
+# (render(finding, location, size, diagnosis), claim_type). Templates are
+# f-string lambdas so rendering a claim doesn't re-parse a format string.
 CLAIM_TEMPLATES = [
-    ("There is {finding} in the {location}.", "finding"),
-    ("No {finding} is identified.", "absence"),
-    ("The {finding} measures {size} cm.", "measurement"),
-    ("Findings are consistent with {diagnosis}.", "impression"),
-    ("{finding} is noted, possibly representing {diagnosis}.", "impression"),
-    ("Mild {finding} is present.", "finding"),
-    ("The {location} appears within normal limits.", "finding"),
+    (lambda finding, location, size, diagnosis: f"There is {finding} in the {location}.", "finding"),
+    (lambda finding, location, size, diagnosis: f"No {finding} is identified.", "absence"),
+    (lambda finding, location, size, diagnosis: f"The {finding} measures {size} cm.", "measurement"),
+    (lambda finding, location, size, diagnosis: f"Findings are consistent with {diagnosis}.", "impression"),
+    (lambda finding, location, size, diagnosis: f"{finding} is noted, possibly representing {diagnosis}.", "impression"),
+    (lambda finding, location, size, diagnosis: f"Mild {finding} is present.", "finding"),
+    (lambda finding, location, size, diagnosis: f"The {location} appears within normal limits.", "finding"),
 ]
 
 FINDINGS = ["consolidation", "opacity", "effusion", "atelectasis", "pneumothorax",
@@ -30,21 +34,43 @@ LOCATIONS = ["right lower lobe", "left upper lobe", "bilateral lung bases",
              "right hemithorax", "left costophrenic angle", "mediastinum", "right hilum"]
 DIAGNOSES = ["pneumonia", "heart failure", "COPD", "pulmonary edema", "lung cancer",
              "pleural effusion", "atelectasis"]
-SIZES = [str(round(random.uniform(0.5, 4.0), 1)) for _ in range(20)]
+# One generator for the module; every sampler below draws whole arrays from it
+# in a single call rather than one Python-level RNG call per field.
+_rng = np.random.default_rng()
 
+SIZES = np.round(_rng.uniform(0.5, 4.0, size=20), 1).astype(str).tolist()
 
-def make_claim(i: int) -> dict:
-    template, ctype = random.choice(CLAIM_TEMPLATES)
-    text = template.format(
-        finding=random.choice(FINDINGS),
-        location=random.choice(LOCATIONS),
-        size=random.choice(SIZES),
-        diagnosis=random.choice(DIAGNOSES),
-    )
+
+def _sample_claim_texts(n: int) -> list[tuple[str, str]]:
+    """Draw n (text, claim_type) pairs, sampling every template slot as one array."""
+    templates = _rng.integers(len(CLAIM_TEMPLATES), size=n).tolist()
+    findings = _rng.integers(len(FINDINGS), size=n).tolist()
+    locations = _rng.integers(len(LOCATIONS), size=n).tolist()
+    sizes = _rng.integers(len(SIZES), size=n).tolist()
+    diagnoses = _rng.integers(len(DIAGNOSES), size=n).tolist()
+    out = []
+    for t, f, loc, sz, d in zip(templates, findings, locations, sizes, diagnoses):
+        render, ctype = CLAIM_TEMPLATES[t]
+        text = render(FINDINGS[f], LOCATIONS[loc], SIZES[sz], DIAGNOSES[d])
+        out.append((text, ctype))
+    return out
+
+
+def _claim(i: int, text: str, ctype: str) -> dict:
     return {"claim_id": f"c{i+1}", "text": text, "sentence_span": {"start": i*60, "end": i*60+len(text)}, "claim_type": ctype}
 
 
+def make_claim(i: int) -> dict:
+    return _claim(i, *_sample_claim_texts(1)[0])
+
+
 LABELS = ["supported", "uncertain", "needs_review"]
+LABEL_WEIGHTS = [0.5, 0.3, 0.2]
+# Evidence sentence per label index, built once
+_EVIDENCE = [
+    f"Visual evidence {'supports' if label == 'supported' else 'does not clearly support'} this claim."
+    for label in LABELS
+]
 
 OVERCONFIDENT_PHRASES = [
     ("There is definitely", "There appears to be"),
@@ -53,86 +79,120 @@ OVERCONFIDENT_PHRASES = [
     ("No doubt", "Possibly"),
     ("Confirms", "May suggest"),
 ]
+OVERCONFIDENT_PREFIXES = ["Definite", "Clearly", "Obviously", ""]
+
+
+def make_alignment_examples(n_examples: int, n_claims: int = 4) -> list[dict]:
+    """Sample n_examples reports of n_claims claims each, with labels drawn in one batch."""
+    total = n_examples * n_claims
+    labels = _rng.choice(len(LABELS), size=total, p=LABEL_WEIGHTS).tolist()
+    confidences = _rng.uniform(0.5, 0.95, size=total).round(2).tolist()
+    finding_ids = _rng.integers(1, 4, size=total).tolist()
+    sampled = _sample_claim_texts(total)
+    examples = []
+    k = 0
+    for _ in range(n_examples):
+        claims = []
+        alignments = []
+        for j in range(n_claims):
+            text, ctype = sampled[k]
+            claim = _claim(j, text, ctype)
+            claims.append(claim)
+            alignments.append({
+                "claim_id": claim["claim_id"],
+                "label": LABELS[labels[k]],
+                "evidence": _EVIDENCE[labels[k]],
+                "confidence": confidences[k],
+                "related_finding_ids": [f"f{finding_ids[k]}"],
+                "claim_text": text,
+            })
+            k += 1
+        examples.append({"claims": claims, "alignments": alignments})
+    return examples
 
 
 def make_alignment_example(n_claims: int = 4) -> dict:
-    claims = [make_claim(i) for i in range(n_claims)]
-    alignments = []
-    for claim in claims:
-        label = random.choices(LABELS, weights=[0.5, 0.3, 0.2])[0]
-        alignments.append({
-            "claim_id": claim["claim_id"],
-            "label": label,
-            "evidence": f"Visual evidence {'supports' if label=='supported' else 'does not clearly support'} this claim.",
-            "confidence": round(random.uniform(0.5, 0.95), 2),
-            "related_finding_ids": [f"f{random.randint(1,3)}"],
-            "claim_text": claim["text"],
-        })
-    return {"claims": claims, "alignments": alignments}
+    return make_alignment_examples(1, n_claims)[0]
+
+
+_ALIGNMENT_SCHEMA_JSON = json.dumps({
+    "type": "object", "required": ["alignments"],
+    "properties": {"alignments": {"type": "array"}}
+})
+_BAD_OUTPUTS = [
+    lambda good: "The claims appear to be supported by the imaging evidence.",
+    lambda good: "```alignment\n" + good[:50],
+    lambda good: '{"partial": true}',
+]
+
+
+def make_json_compliance_pairs(n: int) -> list[dict]:
+    """Return n (prompt, bad_response, good_response) dicts for JSON schema compliance training."""
+    bad_choices = _rng.integers(len(_BAD_OUTPUTS), size=n).tolist()
+    pairs = []
+    for example, bad_idx in zip(make_alignment_examples(n), bad_choices):
+        claims_json = json.dumps(example["claims"], indent=2)
+        prompt = f"Align the following claims to image findings.\nClaims:\n{claims_json}\nRespond with JSON matching: {_ALIGNMENT_SCHEMA_JSON}"
+        good = json.dumps({"alignments": example["alignments"]}, indent=2)
+        # Simulate bad output (no JSON, or truncated)
+        pairs.append({"prompt": prompt, "bad": _BAD_OUTPUTS[bad_idx](good), "good": good})
+    return pairs
 
 
 def make_json_compliance_pair() -> dict:
     """Return (prompt, bad_response, good_response) for JSON schema compliance training."""
-    example = make_alignment_example()
-    claims_json = json.dumps(example["claims"], indent=2)
-    schema = json.dumps({
-        "type": "object", "required": ["alignments"],
-        "properties": {"alignments": {"type": "array"}}
-    })
-    prompt = f"Align the following claims to image findings.\nClaims:\n{claims_json}\nRespond with JSON matching: {schema}"
-    good = json.dumps({"alignments": example["alignments"]}, indent=2)
-    # Simulate bad output (no JSON, or truncated)
-    bad = random.choice([
-        "The claims appear to be supported by the imaging evidence.",
-        "```alignment\n" + good[:50],
-        '{"partial": true}',
-    ])
-    return {"prompt": prompt, "bad": bad, "good": good}
+    return make_json_compliance_pairs(1)[0]
+
+
+def make_uncertainty_pairs(n: int) -> list[dict]:
+    """Return n (overconfident_text, calibrated_text) dicts for uncertainty training."""
+    # Randomly select a claim text and make it overconfident, then calibrate
+    claim_texts = [text for text, _ctype in _sample_claim_texts(n)]
+    prefixes = _rng.integers(len(OVERCONFIDENT_PREFIXES), size=n).tolist()
+    pairs = []
+    for original, prefix_idx in zip(claim_texts, prefixes):
+        calibrated = original
+        for over, cal in OVERCONFIDENT_PHRASES:
+            if over.lower() in original.lower():
+                calibrated = original.replace(over, cal)
+                break
+        # Add a random overconfident phrase
+        original = (OVERCONFIDENT_PREFIXES[prefix_idx] + " " + original).strip()
+        pairs.append({"overconfident": original, "calibrated": calibrated})
+    return pairs
 
 
 def make_uncertainty_pair() -> dict:
     """Return (overconfident_text, calibrated_text) for uncertainty training."""
-    # Randomly select a claim text and make it overconfident, then calibrate
-    claim_text = make_claim(0)["text"]
-    original = claim_text
-    calibrated = claim_text
-    for over, cal in OVERCONFIDENT_PHRASES:
-        if over.lower() in original.lower():
-            calibrated = original.replace(over, cal)
-            break
-    # Add a random overconfident phrase
-    original = random.choice(["Definite", "Clearly", "Obviously", ""]) + " " + original
-    original = original.strip()
-    return {"overconfident": original, "calibrated": calibrated}
+    return make_uncertainty_pairs(1)[0]
+
+
+def _write_jsonl(path: Path, rows) -> None:
+    """Encode all rows up front and write the file in a single call."""
+    path.write_bytes(b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows))
 
 
 def generate_dataset(n_train: int = 200, n_eval: int = 50) -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
     # JSON schema compliance dataset
-    train_pairs = [make_json_compliance_pair() for _ in range(n_train)]
-    eval_pairs = [make_json_compliance_pair() for _ in range(n_eval)]
+    train_pairs = make_json_compliance_pairs(n_train)
+    eval_pairs = make_json_compliance_pairs(n_eval)
 
     train_jsonl = OUTPUT_DIR / "train.jsonl"
     eval_jsonl = OUTPUT_DIR / "eval.jsonl"
 
-    with open(train_jsonl, "w") as f:
-        for pair in train_pairs:
-            f.write(json.dumps({"prompt": pair["prompt"], "completion": pair["good"]}) + "\n")
-    with open(eval_jsonl, "w") as f:
-        for pair in eval_pairs:
-            f.write(json.dumps({"prompt": pair["prompt"], "completion": pair["good"]}) + "\n")
+    _write_jsonl(train_jsonl, ({"prompt": p["prompt"], "completion": p["good"]} for p in train_pairs))
+    _write_jsonl(eval_jsonl, ({"prompt": p["prompt"], "completion": p["good"]} for p in eval_pairs))
 
     # Uncertainty calibration dataset
-    unc_train = [make_uncertainty_pair() for _ in range(n_train)]
-    unc_eval = [make_uncertainty_pair() for _ in range(n_eval)]
-
-    with open(OUTPUT_DIR / "uncertainty_train.jsonl", "w") as f:
-        for pair in unc_train:
-            f.write(json.dumps({"input": pair["overconfident"], "output": pair["calibrated"]}) + "\n")
-    with open(OUTPUT_DIR / "uncertainty_eval.jsonl", "w") as f:
-        for pair in unc_eval:
-            f.write(json.dumps({"input": pair["overconfident"], "output": pair["calibrated"]}) + "\n")
+    unc_train = make_uncertainty_pairs(n_train)
+    unc_eval = make_uncertainty_pairs(n_eval)
+
+    _write_jsonl(OUTPUT_DIR / "uncertainty_train.jsonl",
+                 ({"input": p["overconfident"], "output": p["calibrated"]} for p in unc_train))
+    _write_jsonl(OUTPUT_DIR / "uncertainty_eval.jsonl",
+                 ({"input": p["overconfident"], "output": p["calibrated"]} for p in unc_eval))
 
     print(f"Generated {n_train} train + {n_eval} eval pairs in {OUTPUT_DIR}")
 
@@ -13,44 +13,48 @@ Usage:
      [--lora path/to/adapter] [--test-file hf_lora/dataset/eval.jsonl] [--n 50]
 """
 import argparse
-import json
+import functools
+import itertools
 import logging
+import random
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
 OVERCONFIDENT_PATTERNS = [
     r"\bdefinitely\b", r"\bclearly\b", r"\bobviously\b", r"\bconfirms\b",
     r"\bno doubt\b", r"\bwithout question\b", r"\bconclusively\b",
 ]
+# All patterns fused into one case-insensitive pass
+_OVERCONFIDENT_RE = re.compile("|".join(OVERCONFIDENT_PATTERNS), re.IGNORECASE)
+_JSON_BRACE_RE = re.compile(r"\{.*\}", re.DOTALL)
 LABELS = {"supported", "uncertain", "needs_review"}
 
 
-def is_json_valid(text: str) -> bool:
+def _parse_output(text: str) -> tuple[dict | None, bool]:
+    """Parse a model output once; the flag is True if it needed regex repair."""
     try:
-        data = json.loads(text)
-        return "alignments" in data and isinstance(data["alignments"], list)
+        return orjson.loads(text), False
     except Exception:
-        return False
-
-
-def try_extract_json(text: str) -> dict | None:
-    try:
-        return json.loads(text)
-    except Exception:
-        m = re.search(r"\{.*\}", text, re.DOTALL)
+        m = _JSON_BRACE_RE.search(text)
         if m:
             try:
-                return json.loads(m.group(0))
+                return orjson.loads(m.group(0)), True
             except Exception:
                 pass
-    return None
+    return None, False
+
+
+def try_extract_json(text: str) -> dict | None:
+    return _parse_output(text)[0]
 
 
 def has_overconfident_language(text: str) -> bool:
-    text_lower = text.lower()
-    return any(re.search(p, text_lower) for p in OVERCONFIDENT_PATTERNS)
+    return _OVERCONFIDENT_RE.search(text) is not None
 
 
 def label_accuracy(predicted: list[dict], ground_truth: list[dict]) -> float:
@@ -59,11 +63,44 @@ def label_accuracy(predicted: list[dict], ground_truth: list[dict]) -> float:
     return correct / max(len(predicted), 1)
 
 
-def evaluate_model(model_output_fn, test_cases: list[dict]) -> dict:
+def _call_one(model_output_fn, prompt: str) -> str:
+    try:
+        return model_output_fn(prompt)
+    except Exception as e:
+        logger.warning("Inference failed: %s", e)
+        return ""
+
+
+def generate_outputs(model_output_fn, prompts: list[str], batch_size: int = 8) -> list[str]:
+    """
+    Run model_output_fn over all prompts, batch_size at a time.
+
+    If model_output_fn has a .batch attribute (callable(list[str]) -> list[str]),
+    each chunk goes through it as one padded generate call; otherwise prompts
+    are run on a thread pool. Failed prompts yield "".
+    """
+    batch_fn = getattr(model_output_fn, "batch", None)
+    if batch_fn is None:
+        with ThreadPoolExecutor(max_workers=batch_size) as ex:
+            return list(ex.map(functools.partial(_call_one, model_output_fn), prompts))
+    outputs: list[str] = []
+    for start in range(0, len(prompts), batch_size):
+        chunk = prompts[start:start + batch_size]
+        try:
+            outputs.extend(batch_fn(chunk))
+        except Exception as e:
+            logger.warning("Batched inference failed: %s", e)
+            outputs.extend([""] * len(chunk))
+    return outputs
+
+
+def evaluate_model(model_output_fn, test_cases: list[dict], batch_size: int = 8) -> dict:
     """
     Args:
-        model_output_fn: callable(prompt) -> str
+        model_output_fn: callable(prompt) -> str, optionally with a .batch
+            callable(list[str]) -> list[str] (see generate_outputs)
         test_cases: list of {"prompt": str, "completion": str, "ground_truth_alignments": list}
+        batch_size: prompts per batched generate call / worker threads
     """
     n = len(test_cases)
     json_valid = 0
@@ -72,33 +109,28 @@ def evaluate_model(model_output_fn, test_cases: list[dict]) -> dict:
     label_accs = []
     all_labels_valid = []
 
-    for case in test_cases:
-        prompt = case["prompt"]
+    outputs = generate_outputs(model_output_fn, [case["prompt"] for case in test_cases], batch_size)
+
+    for case, output in zip(test_cases, outputs):
         gt_alignments = case.get("ground_truth_alignments", [])
 
-        try:
-            output = model_output_fn(prompt)
-        except Exception as e:
-            logger.warning("Inference failed: %s", e)
-            output = ""
+        # Parse once; validity, repair and label checks all reuse it
+        parsed, repaired = _parse_output(output)
 
         # Check JSON validity
-        if is_json_valid(output):
+        if not repaired and isinstance(parsed, dict) and isinstance(parsed.get("alignments"), list):
+            json_valid += 1
+        elif parsed and "alignments" in parsed:
+            # Needed repair: recovered by regex, or parsed directly with a non-list "alignments"
             json_valid += 1
-        else:
-            # Try repair
-            parsed = try_extract_json(output)
-            if parsed and "alignments" in parsed:
-                json_valid += 1
-                schema_repaired += 1
+            schema_repaired += 1
 
         # Check overconfidence
         if has_overconfident_language(output):
             overconfident += 1
 
         # Label value validity and accuracy
-        parsed = try_extract_json(output) or {}
-        predicted = parsed.get("alignments", [])
+        predicted = (parsed or {}).get("alignments", [])
         if predicted:
             pred_labels = [a.get("label", "") for a in predicted]
             valid = all(l in LABELS for l in pred_labels)
@@ -118,30 +150,28 @@ def evaluate_model(model_output_fn, test_cases: list[dict]) -> dict:
 
 def mock_base_fn(prompt: str) -> str:
     """Simulate base model with ~72% JSON validity and 31% overconfidence."""
-    import random
     if random.random() < 0.28:
         return "The claims appear to be supported by the imaging evidence."
     overconf = random.random() < 0.31
     prefix = "Clearly, " if overconf else ""
-    return json.dumps({
+    return orjson.dumps({
         "alignments": [
             {"claim_id": "c1", "label": "supported", "evidence": prefix + "Imaging shows findings.", "confidence": 0.9}
         ]
-    })
+    }).decode()
 
 
 def mock_lora_fn(prompt: str) -> str:
     """Simulate LoRA model with ~96% JSON validity and 9% overconfidence."""
-    import random
     if random.random() < 0.04:
         return "Unable to parse."
     overconf = random.random() < 0.09
     prefix = "Clearly, " if overconf else ""
-    return json.dumps({
+    return orjson.dumps({
         "alignments": [
             {"claim_id": "c1", "label": "supported", "evidence": prefix + "Imaging shows findings.", "confidence": 0.85}
         ]
-    })
+    }).decode()
 
 
 def main():
@@ -152,20 +182,18 @@ def main():
     parser.add_argument("--test-file", default="hf_lora/dataset/eval.jsonl")
     parser.add_argument("--n", type=int, default=50, help="Number of test cases")
     parser.add_argument("--mock", action="store_true", help="Use mock inference (no GPU needed)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Prompts per batched generate call")
     args = parser.parse_args()
 
     test_path = Path(args.test_file)
-    test_cases = []
     if test_path.exists():
-        with open(test_path) as f:
-            for line in f:
-                test_cases.append(json.loads(line.strip()))
+        # Only the first --n lines are read and parsed, however large the file
+        with open(test_path, "rb") as f:
+            test_cases = [orjson.loads(line) for line in itertools.islice(f, args.n)]
     else:
         logger.warning("Test file not found — using mock cases")
         test_cases = [{"prompt": f"Align claim c{i}", "completion": ""} for i in range(args.n)]
 
-    test_cases = test_cases[:args.n]
-
     if args.mock or not args.base:
         logger.info("Using mock inference functions")
         base_fn = mock_base_fn
@@ -180,12 +208,22 @@ def main():
             model = AutoModelForCausalLM.from_pretrained(args.base, torch_dtype=torch.bfloat16, device_map="auto")
             processor = AutoProcessor.from_pretrained(args.base)
 
+            # Left-pad so all rows' generated tokens start at the same offset
+            processor.tokenizer.padding_side = "left"
+
             def make_fn(m):
-                def fn(prompt):
-                    inputs = processor(text=[prompt], return_tensors="pt").to(m.device)
+                def batch(prompts):
+                    inputs = processor(text=prompts, return_tensors="pt", padding=True).to(m.device)
                     with torch.no_grad():
-                        out = m.generate(**inputs, max_new_tokens=512, do_sample=False)
-                    return processor.decode(out[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+                        out = m.generate(
+                            **inputs, max_new_tokens=512, do_sample=False,
+                            pad_token_id=processor.tokenizer.pad_token_id,
+                        )
+                    return processor.batch_decode(out[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+                def fn(prompt):
+                    return batch([prompt])[0]
+                fn.batch = batch
                 return fn
 
             base_fn = make_fn(model)
@@ -202,10 +240,10 @@ def main():
             lora_fn = mock_lora_fn
 
     logger.info("Evaluating base model on %d cases...", len(test_cases))
-    base_metrics = evaluate_model(base_fn, test_cases)
+    base_metrics = evaluate_model(base_fn, test_cases, args.batch_size)
 
     logger.info("Evaluating LoRA model on %d cases...", len(test_cases))
-    lora_metrics = evaluate_model(lora_fn, test_cases)
+    lora_metrics = evaluate_model(lora_fn, test_cases, args.batch_size)
 
     results = {
         "base_model": base_metrics,
@@ -215,8 +253,7 @@ def main():
 
     out_path = Path("eval/sample_outputs/eval_metrics.json")
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w") as f:
-        json.dump(results, f, indent=2)
+    out_path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
 
     print("\n=== Results ===")
     print(f"{'Metric':<30} {'Base':>10} {'LoRA':>10} {'Delta':>10}")
@@ -5,6 +5,7 @@ Validates that all components are wired up correctly.
 Usage:
   MEDGEMMA_MOCK=true python scripts/smoke_test.py
 """
+import functools
 import sys
 import os
 from pathlib import Path
@@ -14,92 +15,238 @@ ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
 os.environ.setdefault("MEDGEMMA_MOCK", "true")
+os.environ.setdefault("RTL_BCRYPT_ROUNDS", "4")
 
 
-def test_pipeline():
+_DUMMY_REPORT = (
+    "There is consolidation in the right lower lobe consistent with pneumonia. "
+    "No pleural effusion is identified. "
+    "The cardiomediastinal silhouette is within normal limits. "
+    "No pneumothorax is seen. "
+    "Mild hyperinflation is noted, possibly consistent with early COPD."
+)
+
+_REQUIRED_KEYS = frozenset({
+    "overall_score", "severity", "claims", "alignments", "rewrites",
+    "clinician_summary", "patient_explanation", "edited_report",
+})
+_SEVERITIES = frozenset({"low", "medium", "high"})
+
+
+@functools.lru_cache(maxsize=1)
+def _dummy_image():
+    """Dummy grayscale "X-ray" as RGB, built once per process and reused by repeat runs."""
     from PIL import Image
     import numpy as np
 
-    # Create a dummy grayscale "X-ray" image
-    img_array = np.random.randint(50, 200, (512, 512), dtype=np.uint8)
-    image = Image.fromarray(img_array, mode="L").convert("RGB")
+    img_array = np.random.default_rng(0).integers(50, 200, (512, 512), dtype=np.uint8)
+    # Grey replicated across three channels, built once in numpy instead of a PIL L→RGB pass
+    rgb = np.ascontiguousarray(np.broadcast_to(img_array[..., None], (512, 512, 3)))
+    return Image.fromarray(rgb)
 
-    report = (
-        "There is consolidation in the right lower lobe consistent with pneumonia. "
-        "No pleural effusion is identified. "
-        "The cardiomediastinal silhouette is within normal limits. "
-        "No pneumothorax is seen. "
-        "Mild hyperinflation is noted, possibly consistent with early COPD."
-    )
+
+def test_pipeline():
+    image = _dummy_image()
+    report = _DUMMY_REPORT
 
     from core.pipeline.audit_pipeline import run_audit
 
-    steps_logged = []
+    step_count = 0
     def progress_cb(step, total, msg):
-        steps_logged.append((step, total, msg))
+        nonlocal step_count
+        step_count += 1
         print(f"  [{step}/{total}] {msg}")
 
     print("Running audit pipeline (mock mode)...")
     result = run_audit(image=image, report_text=report, case_label="smoke_test", progress_cb=progress_cb)
 
     # Assertions
-    assert result["overall_score"] >= 0, "Score must be >= 0"
-    assert result["overall_score"] <= 100, "Score must be <= 100"
-    assert result["severity"] in ("low", "medium", "high"), f"Bad severity: {result['severity']}"
+    missing = _REQUIRED_KEYS - result.keys()
+    assert not missing, f"Missing: {', '.join(sorted(missing))}"
+    assert 0 <= result["overall_score"] <= 100, f"Score out of range: {result['overall_score']}"
+    assert result["severity"] in _SEVERITIES, f"Bad severity: {result['severity']}"
     assert len(result["claims"]) > 0, "No claims extracted"
     assert len(result["alignments"]) > 0, "No alignments"
-    assert "rewrites" in result, "Missing rewrites"
-    assert "clinician_summary" in result, "Missing clinician_summary"
-    assert "patient_explanation" in result, "Missing patient_explanation"
-    assert "edited_report" in result, "Missing edited_report"
-    assert len(steps_logged) == 6, f"Expected 6 progress steps, got {len(steps_logged)}"
+    assert step_count == 6, f"Expected 6 progress steps, got {step_count}"
 
     print(f"\nPASS: Pipeline OK — Score: {result['overall_score']}/100, Severity: {result['severity']}")
     return result
 
 
+def test_result_cache():
+    import tempfile
+    from core import config
+    from core.pipeline import audit_pipeline, medgemma_client
+    from core.util.files import read_json, write_json
+    from core.util.hashing import hash_image, hash_string
+
+    image = _dummy_image()
+    patched = ("RTL_RESULT_CACHE", "RESULT_CACHE_DIR", "INFER_CACHE_DIR", "RUNS_DIR")
+    saved = {name: getattr(config, name) for name in patched}
+    real_infer = medgemma_client.infer_structured
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            config.RTL_RESULT_CACHE = True
+            config.RESULT_CACHE_DIR = Path(tmp) / "cache"
+            config.INFER_CACHE_DIR = config.RESULT_CACHE_DIR / "infer"
+            config.RUNS_DIR = Path(tmp) / "runs"
+
+            def cache_entry(report):
+                return audit_pipeline._cache_path(hash_image(image), hash_string(report), config.RTL_LORA_ID)
+
+            first = audit_pipeline.run_audit(image=image, report_text=_DUMMY_REPORT, case_label="cache_1")
+            entry = cache_entry(_DUMMY_REPORT)
+            assert entry.exists(), "Clean audit was not cached"
+            # Age the stored timestamp so the hit's fresh created_at is observable
+            stored = read_json(entry)
+            stored["created_at"] = "2000-01-01T00:00:00Z"
+            write_json(entry, stored)
+
+            messages = []
+            second = audit_pipeline.run_audit(
+                image=image, report_text=_DUMMY_REPORT, case_label="cache_2",
+                progress_cb=lambda step, total, msg: messages.append(msg),
+            )
+            assert messages == ["Loaded cached audit result"], f"Expected a cache hit, got {messages}"
+            assert second["run_id"] != first["run_id"], "Cache hit reused the run_id"
+            assert second["created_at"] != "2000-01-01T00:00:00Z", "Cache hit kept the stored created_at"
+            assert second["case_label"] == "cache_2", f"Wrong case_label: {second['case_label']}"
+            assert second["results_path"] != first["results_path"], "Cache hit reused the results_path"
+            assert Path(second["results_path"]).exists(), "Cache hit was not persisted to its run dir"
+            assert second["overall_score"] == first["overall_score"], "Cached score differs"
+
+            # An audit with a fallback step must not be cached
+            def failing_infer(*args, task_name="task", **kwargs):
+                if task_name == "clinician_summary":
+                    return medgemma_client._fallback_result(task_name), ["forced failure"]
+                return real_infer(*args, task_name=task_name, **kwargs)
+
+            medgemma_client.infer_structured = failing_infer
+            failing_report = _DUMMY_REPORT + " Heart size is normal."
+            failed = audit_pipeline.run_audit(image=image, report_text=failing_report, case_label="cache_err")
+            assert failed["pipeline_errors"], "Forced failure produced no errors"
+            assert not cache_entry(failing_report).exists(), "Audit with errors was cached"
+        finally:
+            medgemma_client.infer_structured = real_infer
+            for name, value in saved.items():
+                setattr(config, name, value)
+
+    print("PASS: Result cache OK")
+
+
 def test_database():
-    from core.db.db import get_conn, init_db
+    import sqlite3
+    from core.db.db import init_schema, tx
     from core.db.repo import create_user, authenticate_user, create_run, list_recent_runs_for_user
 
-    # Use temp DB
-    import tempfile
-    with tempfile.TemporaryDirectory() as tmp:
-        db_path = Path(tmp) / "test.db"
-        schema_path = ROOT / "core" / "db" / "schema.sql"
-        init_db(db_path, schema_path)
-        conn = get_conn(db_path)
-
-        # Test user creation
-        uid = create_user(conn, "test@test.com", "Test User", "password123")
-        assert uid, "No user_id returned"
-
-        # Test authentication
-        authed = authenticate_user(conn, "test@test.com", "password123")
-        assert authed == uid, "Auth failed"
-
-        # Test wrong password
-        bad_auth = authenticate_user(conn, "test@test.com", "wrongpassword")
-        assert bad_auth is None, "Bad auth should return None"
-
-        # Test run creation
-        run_id = create_run(
-            conn, user_id=uid,
-            image_hash="abc123", report_hash="def456",
-            case_label="test_case", model_name="medgemma",
-            model_version="google/medgemma-4b-it", prompt_version="v1",
-            overall_score=85, severity="low", flag_counts={"supported":4,"uncertain":1},
-            results_path="/tmp/results.json",
-        )
-        assert run_id, "No run_id returned"
+    # Use an in-memory DB: same schema, no files or fsyncs
+    schema_path = ROOT / "core" / "db" / "schema.sql"
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        init_schema(conn, schema_path)
+        # Commit every write below at once
+        with tx(conn):
+            # Test user creation
+            uid = create_user(conn, "test@test.com", "Test User", "password123")
+            assert uid, "No user_id returned"
+
+            # Test authentication
+            authed = authenticate_user(conn, "test@test.com", "password123")
+            assert authed == uid, "Auth failed"
+
+            # Test wrong password
+            bad_auth = authenticate_user(conn, "test@test.com", "wrongpassword")
+            assert bad_auth is None, "Bad auth should return None"
+
+            # Test run creation
+            run_id = create_run(
+                conn, user_id=uid,
+                image_hash="abc123", report_hash="def456",
+                case_label="test_case", model_name="medgemma",
+                model_version="google/medgemma-4b-it", prompt_version="v1",
+                overall_score=85, severity="low", flag_counts={"supported":4,"uncertain":1},
+                results_path="/tmp/results.json",
+            )
+            assert run_id, "No run_id returned"
 
         # Test listing
         rows = list_recent_runs_for_user(conn, uid)
         assert len(rows) == 1, f"Expected 1 run, got {len(rows)}"
+    finally:
+        conn.close()
 
     print("PASS: Database OK")
 
 
+def test_database_file():
+    import sqlite3
+    import tempfile
+    from core.db.db import get_conn, init_db, tx, close_pool
+    from core.db.repo import create_run, list_all_runs_for_user, list_recent_runs_for_user
+
+    schema_path = ROOT / "core" / "db" / "schema.sql"
+    # The runs table as released before the integer flag-count columns existed
+    old_schema = "\n".join(
+        line for line in schema_path.read_text(encoding="utf-8").splitlines() if "fc_" not in line
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "test.db"
+
+        # Seed a legacy database holding one run with only flag_counts_json
+        legacy = sqlite3.connect(db_path)
+        try:
+            legacy.executescript(old_schema)
+            legacy.execute(
+                "INSERT INTO users VALUES ('u_legacy', 'old@test.com', 'Old User', 'x', '2024-01-01T00:00:00Z')"
+            )
+            legacy.execute(
+                """INSERT INTO runs
+                (run_id, user_id, created_at, input_image_hash, input_report_hash, case_label,
+                 model_name, model_version, lora_id, prompt_version, overall_score, severity,
+                 flag_counts_json, status, results_path)
+                VALUES ('r_legacy', 'u_legacy', '2024-01-01T00:00:00Z', 'img', 'rpt', 'legacy_case',
+                        'medgemma', 'google/medgemma-4b-it', '', 'v1', 60, 'medium',
+                        '{"supported": 2, "uncertain": 1, "needs_review": 3}', 'complete', '/tmp/old.json')"""
+            )
+            legacy.commit()
+        finally:
+            legacy.close()
+
+        try:
+            # Migrates the legacy table, then applies the current schema
+            init_db(db_path, schema_path)
+
+            with get_conn(db_path) as conn, tx(conn):
+                run_id = create_run(
+                    conn, user_id="u_legacy",
+                    image_hash="abc123", report_hash="def456",
+                    case_label="pooled_case", model_name="medgemma",
+                    model_version="google/medgemma-4b-it", prompt_version="v1",
+                    overall_score=85, severity="low", flag_counts={"supported": 4, "uncertain": 1},
+                    results_path="/tmp/results.json",
+                )
+
+            # Read back on a second lease: the write must have been committed
+            with get_conn(db_path) as conn:
+                cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+                assert cache_size == -20000, f"Pool pragmas not applied: cache_size={cache_size}"
+                recent = list_recent_runs_for_user(conn, "u_legacy")
+                assert len(recent) == 2, f"Expected 2 runs, got {len(recent)}"
+                runs = {r["run_id"]: r for r in list_all_runs_for_user(conn, "u_legacy")}
+            assert runs[run_id]["flag_counts"] == {"supported": 4, "uncertain": 1, "needs_review": 0}, \
+                f"Wrong flag counts: {runs[run_id]['flag_counts']}"
+            backfilled = runs["r_legacy"]["flag_counts"]
+            assert backfilled == {"supported": 2, "uncertain": 1, "needs_review": 3}, \
+                f"Legacy flag counts not backfilled: {backfilled}"
+        finally:
+            close_pool(db_path)
+
+    print("PASS: Database file + migration OK")
+
+
 def test_scoring():
     from core.scoring.score import compute_score
 
@@ -141,6 +288,99 @@ def test_validation():
     print("PASS: Validation OK")
 
 
+def test_parse_zip():
+    import io
+    import tempfile
+    import zipfile
+    from PIL import Image
+    from core.batch.parse_zip import SkippedCase, parse_zip
+
+    def png(img):
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        return buf.getvalue()
+
+    sources = {
+        "case_a_stored": Image.new("RGB", (16, 12), (200, 30, 30)),
+        "case_b_deflated": Image.new("L", (10, 10), 90),
+        "case_c_descriptor": Image.new("RGB", (8, 20), (10, 220, 40)),
+    }
+    flat_source = Image.new("RGB", (6, 6), (1, 2, 3))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mixed = Path(tmp) / "mixed.zip"
+        with zipfile.ZipFile(mixed, "w") as zf:
+            zf.writestr("case_a_stored/image.png", png(sources["case_a_stored"]), zipfile.ZIP_STORED)
+            zf.writestr("case_b_deflated/image.png", png(sources["case_b_deflated"]), zipfile.ZIP_DEFLATED)
+            # zipfile only emits a data descriptor (flag bit 3) when it can't seek back
+            zf._seekable = False
+            zf.writestr("case_c_descriptor/image.png", png(sources["case_c_descriptor"]), zipfile.ZIP_STORED)
+            zf._seekable = True
+            zf.writestr("case_d_fake/image.png", b"this is not an image", zipfile.ZIP_STORED)
+            for case_id in ("case_a_stored", "case_b_deflated", "case_c_descriptor", "case_d_fake"):
+                zf.writestr(f"{case_id}/report.txt", f"  Report for {case_id}.\n")
+            zf.writestr("__MACOSX/image.png", png(flat_source))
+            zf.writestr("__MACOSX/report.txt", "resource fork")
+            zf.writestr("flat01.png", png(flat_source))
+            zf.writestr("flat01.txt", "Flat report.")
+        with zipfile.ZipFile(mixed) as zf:
+            assert zf.getinfo("case_c_descriptor/image.png").flag_bits & 0x08, "Descriptor entry not built"
+
+        cases, skipped = parse_zip(mixed)
+        ids = [c.case_id for c in cases]
+        assert ids == ["case_a_stored", "case_b_deflated", "case_c_descriptor"], f"Wrong cases: {ids}"
+        assert skipped == [SkippedCase("case_d_fake", "image.png is not a supported image")], f"Wrong skips: {skipped}"
+        for case in cases:
+            assert case.report_text == f"Report for {case.case_id}.", f"Wrong report: {case.report_text!r}"
+            img = case.image_loader()
+            expected = sources[case.case_id].convert("RGB")
+            assert img.mode == "RGB", f"{case.case_id}: mode {img.mode}"
+            assert img.size == expected.size and img.tobytes() == expected.tobytes(), f"{case.case_id}: pixels differ"
+
+        # Flat pairs are used once no folder case is usable
+        flat = Path(tmp) / "flat.zip"
+        with zipfile.ZipFile(flat, "w") as zf:
+            zf.writestr("case_d_fake/image.png", b"this is not an image")
+            zf.writestr("case_d_fake/report.txt", "Fake.")
+            zf.writestr("flat01.png", png(flat_source), zipfile.ZIP_STORED)
+            zf.writestr("flat01.txt", "Flat report.")
+        cases, skipped = parse_zip(flat)
+        assert [c.case_id for c in cases] == ["flat01"], f"Wrong flat cases: {cases}"
+        assert [s.case_id for s in skipped] == ["case_d_fake"], f"Wrong flat skips: {skipped}"
+        assert cases[0].image_loader().tobytes() == flat_source.tobytes(), "flat01: pixels differ"
+
+    print("PASS: ZIP parsing OK")
+
+
+def test_local_batching():
+    from PIL import Image
+    from core.pipeline.medgemma_client import _batch_inputs
+
+    class StubProcessor:
+        """Records the kwargs the batched local path hands to the processor."""
+        def __init__(self):
+            self.tokenizer = type("Tok", (), {"padding_side": "right"})()
+            self.calls = []
+
+        def __call__(self, **kwargs):
+            self.calls.append(kwargs)
+            return kwargs
+
+    proc = StubProcessor()
+    images = [Image.new("RGB", (8, 8)) for _ in range(3)]
+    _batch_inputs(proc, ["a", "b", "c"], images)
+    _batch_inputs(proc, ["d", "e"])
+
+    assert proc.tokenizer.padding_side == "left", "Batches must be left-padded"
+    image_call, text_call = proc.calls
+    groups = image_call["images"]
+    assert len(groups) == len(image_call["text"]), f"Expected one image group per text, got {len(groups)}"
+    assert all(len(g) == 1 and g[0] is img for g, img in zip(groups, images)), "Each text needs exactly its own image"
+    assert "images" not in text_call, "Text-only batches must not pass images"
+
+    print("PASS: Local batching OK")
+
+
 if __name__ == "__main__":
     print("=" * 50)
     print("RTL Smoke Test")
@@ -150,7 +390,11 @@ if __name__ == "__main__":
         test_scoring()
         test_validation()
         test_database()
+        test_database_file()
+        test_parse_zip()
+        test_local_batching()
         test_pipeline()
+        test_result_cache()
         print("\nAll smoke tests passed.")
     except Exception as e:
         print(f"\nFAIL: Smoke test FAILED: {e}")
@@ -17,7 +17,6 @@ Pages:
 Navigation uses gr.Group visibility toggling with a persistent top navigation bar.
 """
 import sys
-import json
 import logging
 import tempfile
 from pathlib import Path
@@ -31,15 +30,16 @@ import gradio as gr
 from PIL import Image
 
 from core import config
-from core.db.db import get_conn, init_db
+from core.db.db import get_conn, init_db, tx
 from core.db.repo import (
     create_user, authenticate_user, get_user_display_name,
     list_recent_runs_for_user, list_all_runs_for_user,
     create_run, list_events_for_run,
-    create_batch, update_batch_progress, link_batch_run,
+    create_batch, update_batch_progress, link_batch_runs_bulk,
 )
 from core.audit_trail.events import EventType, log as log_ev
 from core.util.files import write_json, read_json
+from core.util.hashing import hash_file
 from scripts.init_space_storage import ensure_space_storage
 from spaces_app.ui.components import (
     score_gauge_html, flag_counts_html, claim_table_html, rewrite_suggestions_html
@@ -59,681 +59,8 @@ PAGES = ["landing", "demo", "login", "home", "single", "batch", "detail", "histo
 
 # ─────────────────────────── CSS Design System ───────────────────────────────
 
-RTL_CSS = """
-@import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-
-/* Google-style design system for RTL */
-
-/* Full-bleed — no white edges */
-.gradio-container {
-    font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif !important;
-    max-width: 100% !important;
-    margin: 0 !important;
-    padding: 0 24px !important;
-    background: linear-gradient(180deg, #f0f2f5 0%, #e8eaed 50%, #f0f2f5 100%) !important;
-    min-height: 100vh;
-}
-
-/* Tab styling */
-.gradio-container .tab-nav button.selected {
-    color: #1a73e8 !important;
-    border-color: #1a73e8 !important;
-}
-
-/* Navigation Bar */
-.rtl-nav-bar {
-    display: flex !important;
-    align-items: center !important;
-    gap: 2px !important;
-    padding: 6px 12px !important;
-    background: #f8f9fa !important;
-    border-bottom: 1px solid #e0e0e0 !important;
-    border-radius: 8px !important;
-    margin-bottom: 16px !important;
-}
-.rtl-nav-bar button {
-    background: none !important;
-    border: none !important;
-    border-radius: 20px !important;
-    padding: 8px 18px !important;
-    font-size: 0.875rem !important;
-    font-weight: 500 !important;
-    color: #5f6368 !important;
-    cursor: pointer !important;
-    box-shadow: none !important;
-    min-width: auto !important;
-}
-.rtl-nav-bar button:hover {
-    background: #e8eaed !important;
-    color: #202124 !important;
-}
-
-/* Typography */
-.gradio-container h1, .gradio-container h2, .gradio-container h3 {
-    font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif !important;
-    color: #202124 !important;
-    letter-spacing: -0.01em;
-}
-.gradio-container h2 {
-    font-size: 1.375rem !important;
-    font-weight: 500 !important;
-}
-
-/* Fix code blocks visibility (dark-on-dark bug) */
-.gradio-container code {
-    background: #f1f3f4 !important;
-    color: #202124 !important;
-    padding: 2px 6px !important;
-    border-radius: 4px !important;
-    font-size: 0.85em !important;
-}
-.gradio-container pre code {
-    padding: 12px !important;
-    display: block !important;
-}
-
-/* Primary buttons */
-button.primary {
-    background: #1a73e8 !important;
-    border: none !important;
-    border-radius: 20px !important;
-    font-weight: 500 !important;
-}
-button.primary:hover {
-    background: #1765cc !important;
-}
-button.secondary {
-    border-radius: 20px !important;
-}
-
-/* Status Alerts */
-.rtl-alert {
-    display: flex;
-    align-items: center;
-    gap: 10px;
-    padding: 12px 16px;
-    border-radius: 8px;
-    font-size: 0.875rem;
-    font-weight: 500;
-    margin: 8px 0;
-}
-.rtl-alert-success { background: #e6f4ea; color: #137333; border: 1px solid #ceead6; }
-.rtl-alert-error { background: #fce8e6; color: #c5221f; border: 1px solid #f5c6cb; }
-.rtl-alert-info { background: #e8f0fe; color: #1967d2; border: 1px solid #d2e3fc; }
-
-/* Semantic Dots */
-.rtl-dot {
-    display: inline-block;
-    width: 10px;
-    height: 10px;
-    border-radius: 50%;
-    margin-right: 4px;
-    vertical-align: middle;
-}
-.rtl-dot-green { background: #34a853; }
-.rtl-dot-amber { background: #fbbc04; }
-.rtl-dot-blue  { background: #4285f4; }
-.rtl-dot-red   { background: #ea4335; }
-
-/* Score Card */
-.rtl-score-card {
-    text-align: center;
-    padding: 20px;
-    border-radius: 12px;
-    background: #f8f9fa;
-    border: 1px solid #e0e0e0;
-}
-.rtl-score-number {
-    font-size: 3rem;
-    font-weight: 700;
-    line-height: 1;
-}
-.rtl-score-label {
-    font-size: 0.8125rem;
-    color: #5f6368;
-    margin-top: 4px;
-}
-.rtl-severity-chip {
-    display: inline-block;
-    padding: 4px 12px;
-    border-radius: 16px;
-    font-size: 0.75rem;
-    font-weight: 600;
-    text-transform: uppercase;
-    letter-spacing: 0.03em;
-    margin-top: 8px;
-}
-.rtl-score-bar-bg {
-    background: #e0e0e0;
-    border-radius: 4px;
-    height: 6px;
-    margin-top: 12px;
-    overflow: hidden;
-}
-.rtl-score-bar-fill {
-    height: 6px;
-    border-radius: 4px;
-    transition: width 0.5s ease;
-}
-
-/* Flag Counts */
-.rtl-flags {
-    display: flex;
-    gap: 12px;
-    justify-content: center;
-    padding: 16px;
-    background: #f8f9fa;
-    border-radius: 12px;
-    border: 1px solid #e0e0e0;
-    margin-top: 12px;
-}
-.rtl-flag-item { text-align: center; min-width: 70px; }
-.rtl-flag-count { font-size: 1.5rem; font-weight: 600; line-height: 1; }
-.rtl-flag-label {
-    font-size: 0.6875rem;
-    color: #5f6368;
-    margin-top: 4px;
-    display: flex;
-    align-items: center;
-    justify-content: center;
-    gap: 4px;
-}
-
-/* Tables */
-.rtl-table {
-    width: 100%;
-    border-collapse: collapse;
-    font-size: 0.875rem;
-}
-.rtl-table thead tr {
-    background: #f8f9fa;
-    border-bottom: 2px solid #e0e0e0;
-}
-.rtl-th {
-    padding: 10px 12px;
-    text-align: left;
-    font-weight: 600;
-    color: #5f6368;
-    font-size: 0.8125rem;
-    text-transform: uppercase;
-    letter-spacing: 0.03em;
-}
-.rtl-td {
-    padding: 10px 12px;
-    border-bottom: 1px solid #f1f3f4;
-    color: #202124;
-    font-size: 0.875rem;
-}
-.rtl-table tbody tr:hover { background: #f8f9fa; }
-
-/* Label Badges */
-.rtl-label-badge {
-    display: inline-flex;
-    align-items: center;
-    gap: 6px;
-    font-size: 0.8125rem;
-    font-weight: 500;
-    padding: 3px 10px;
-    border-radius: 12px;
-    white-space: nowrap;
-}
-.rtl-badge-supported { background: #e6f4ea; color: #137333; }
-.rtl-badge-uncertain { background: #fef7e0; color: #b06000; }
-.rtl-badge-needs-review { background: #fce8e6; color: #c5221f; }
-
-/* Rewrite Cards */
-.rtl-rewrite-card {
-    margin-bottom: 12px;
-    padding: 16px;
-    background: #ffffff;
-    border: 1px solid #e0e0e0;
-    border-radius: 8px;
-}
-.rtl-rewrite-label {
-    font-size: 0.6875rem;
-    font-weight: 600;
-    text-transform: uppercase;
-    letter-spacing: 0.05em;
-    margin-bottom: 4px;
-}
-.rtl-rewrite-suggested {
-    background: #e6f4ea;
-    border: 1px solid #ceead6;
-    padding: 8px 12px;
-    border-radius: 6px;
-    color: #137333;
-    margin: 4px 0 8px 0;
-}
-.rtl-rewrite-reason {
-    font-size: 0.8125rem;
-    color: #5f6368;
-    font-style: italic;
-}
-
-/* PHI Banner */
-.rtl-phi-banner {
-    display: flex;
-    align-items: center;
-    gap: 8px;
-    padding: 8px 14px;
-    background: #e8f0fe;
-    border-radius: 8px;
-    font-size: 0.8125rem;
-    color: #1967d2;
-    margin-bottom: 12px;
-}
-
-/* Mode Chip */
-.rtl-mode-chip {
-    display: inline-flex;
-    align-items: center;
-    gap: 6px;
-    font-size: 0.75rem;
-    font-weight: 500;
-    padding: 4px 10px;
-    border-radius: 12px;
-    background: #f1f3f4;
-    color: #5f6368;
-}
-.rtl-mode-dot {
-    display: inline-block;
-    width: 8px;
-    height: 8px;
-    border-radius: 50%;
-}
-.rtl-mode-mock { background: #fbbc04; }
-.rtl-mode-live { background: #34a853; }
-
-/* Login Container */
-.rtl-login-wrap { max-width: 420px; margin: 40px auto; }
-
-/* Remove ALL group borders/backgrounds for seamless look */
-.gradio-container .group,
-.gradio-container .gr-group,
-.gradio-container > .contain > div {
-    border: none !important;
-    padding: 0 !important;
-    background: none !important;
-    box-shadow: none !important;
-}
-
-/* Demo card buttons — styled as clickable cards */
-.rtl-demo-card-btn {
-    flex: 1 !important;
-    background: #ffffff !important;
-    border: 1px solid #dadce0 !important;
-    border-radius: 12px !important;
-    padding: 20px 16px !important;
-    text-align: left !important;
-    cursor: pointer !important;
-    transition: box-shadow 0.2s, border-color 0.2s !important;
-    min-height: 90px !important;
-    font-size: 0.875rem !important;
-    color: #202124 !important;
-    line-height: 1.6 !important;
-    box-shadow: none !important;
-}
-.rtl-demo-card-btn:hover {
-    box-shadow: 0 1px 6px rgba(32,33,36,0.15) !important;
-    border-color: #1a73e8 !important;
-}
-.rtl-demo-card-btn span {
-    white-space: pre-line !important;
-    text-align: left !important;
-}
-
-/* Nav login button */
-.rtl-nav-login {
-    color: #1a73e8 !important;
-    font-weight: 600 !important;
-    margin-left: auto !important;
-}
-
-/* ── Landing Page ────────────────────────────────────────────────────── */
-
-.rtl-landing {
-    max-width: 1100px;
-    margin: 0 auto;
-    padding: 32px 20px 0 20px;
-    min-height: 80vh;
-}
-
-.rtl-landing-header {
-    display: flex;
-    justify-content: flex-end;
-    align-items: center;
-    padding: 0 0 32px 0;
-}
-
-.rtl-landing-brand {
-    font-size: 1.1rem;
-    color: #5f6368;
-    letter-spacing: 0.02em;
-}
-.rtl-landing-brand strong {
-    color: #202124;
-    font-weight: 600;
-}
-
-.rtl-landing-content {
-    display: flex;
-    gap: 72px;
-    align-items: flex-start;
-    padding: 0 2%;
-}
-
-.rtl-landing-diagram {
-    flex: 0 0 320px;
-}
-
-.rtl-landing-text {
-    flex: 1;
-    min-width: 0;
-}
-
-.rtl-landing-text h1 {
-    font-size: 2.5rem !important;
-    font-weight: 400 !important;
-    color: #202124 !important;
-    margin: 0 0 20px 0 !important;
-    letter-spacing: -0.02em;
-    line-height: 1.2;
-}
-
-.rtl-landing-text p {
-    color: #3c4043;
-    line-height: 1.8;
-    font-size: 0.95rem;
-    margin-bottom: 16px;
-}
-
-/* Pipeline Architecture Diagram */
-.rtl-model-callout {
-    display: inline-flex;
-    align-items: center;
-    gap: 8px;
-    padding: 8px 14px;
-    background: linear-gradient(135deg, #e8f0fe, #f8f9fa);
-    border: 1.5px solid #d2e3fc;
-    border-radius: 16px;
-    margin-bottom: 0;
-}
-.rtl-model-callout-icon {
-    width: 32px;
-    height: 32px;
-    border-radius: 8px;
-    background: #202124;
-    display: flex;
-    align-items: center;
-    justify-content: center;
-    color: white;
-    font-weight: 700;
-    font-size: 0.65rem;
-    flex-shrink: 0;
-}
-.rtl-model-callout-text {
-    font-size: 0.72rem;
-    color: #3c4043;
-    line-height: 1.3;
-}
-.rtl-model-callout-text strong {
-    color: #202124;
-    display: block;
-    font-size: 0.78rem;
-}
-
-.rtl-pipeline-label {
-    font-size: 0.8rem;
-    font-weight: 600;
-    color: #5f6368;
-    text-transform: uppercase;
-    letter-spacing: 0.05em;
-    margin-bottom: 12px;
-}
-
-.rtl-pipeline-steps {
-    display: flex;
-    flex-direction: column;
-    gap: 0;
-}
-
-.rtl-pipeline-step {
-    display: flex;
-    align-items: center;
-    gap: 12px;
-    padding: 10px 14px;
-    background: #fff;
-    border: 1.5px solid #dadce0;
-    border-radius: 14px;
-    font-size: 0.82rem;
-    color: #202124;
-    font-weight: 500;
-}
-.rtl-pipeline-step:hover {
-    border-color: #1a73e8;
-    box-shadow: 0 1px 4px rgba(26,115,232,0.12);
-}
-
-.rtl-step-num {
-    display: inline-flex;
-    align-items: center;
-    justify-content: center;
-    width: 26px;
-    height: 26px;
-    border-radius: 50%;
-    background: #202124;
-    color: #fff;
-    font-size: 0.7rem;
-    font-weight: 700;
-    flex-shrink: 0;
-}
-
-.rtl-pipeline-connector {
-    width: 2px;
-    height: 6px;
-    background: #dadce0;
-    margin-left: 25px;
-}
-
-/* Metrics Strip — removed, now inline */
-
-/* Disclaimer Badge */
-.rtl-landing-disclaimer {
-    margin: 20px 0 0 0;
-    font-size: 0.82rem;
-    line-height: 1.7;
-    color: #5f6368;
-}
-.rtl-disclaimer-badge {
-    background-color: #5f6368;
-    color: white;
-    padding: 3px 14px;
-    border-radius: 16px;
-    font-size: 0.8rem;
-    font-weight: 500;
-    white-space: nowrap;
-    margin-right: 6px;
-    display: inline-block;
-    transform: translateY(-1px);
-}
-
-/* CTA Button Row */
-.rtl-landing-cta-row {
-    justify-content: flex-start !important;
-    gap: 12px !important;
-    padding: 24px 0 16px 0 !important;
-}
-.rtl-cta-btn {
-    background-color: #202124 !important;
-    color: white !important;
-    padding: 12px 32px !important;
-    border: none !important;
-    border-radius: 25px !important;
-    font-size: 1rem !important;
-    font-weight: 500 !important;
-    box-shadow: none !important;
-    min-width: 160px !important;
-    cursor: pointer !important;
-}
-.rtl-cta-btn:hover {
-    background-color: #3c4043 !important;
-}
-.rtl-cta-secondary {
-    background: none !important;
-    border: 1.5px solid #dadce0 !important;
-    border-radius: 25px !important;
-    padding: 12px 28px !important;
-    font-size: 1rem !important;
-    font-weight: 500 !important;
-    color: #202124 !important;
-    box-shadow: none !important;
-    cursor: pointer !important;
-}
-.rtl-cta-secondary:hover {
-    background: #f8f9fa !important;
-}
-
-/* Nav Bar — seamless, no background */
-.rtl-nav-bar-v2 {
-    display: flex !important;
-    align-items: center !important;
-    gap: 4px !important;
-    padding: 16px 24px 8px 24px !important;
-    background: transparent !important;
-    border: none !important;
-    border-radius: 0 !important;
-    margin-bottom: 0 !important;
-}
-.rtl-nav-bar-v2 button {
-    background: transparent !important;
-    border: none !important;
-    border-radius: 20px !important;
-    padding: 8px 18px !important;
-    font-size: 0.95rem !important;
-    font-weight: 600 !important;
-    color: #3c4043 !important;
-    cursor: pointer !important;
-    box-shadow: none !important;
-    min-width: auto !important;
-    transition: all 0.15s ease !important;
-}
-.rtl-nav-bar-v2 button:hover {
-    background: rgba(0,0,0,0.05) !important;
-    color: #202124 !important;
-}
-.rtl-nav-logo {
-    font-size: 1.2rem !important;
-    font-weight: 800 !important;
-    color: #202124 !important;
-    letter-spacing: 0.02em !important;
-    margin-right: 12px !important;
-}
-
-/* Nav page info bar — hidden */
-.rtl-nav-page-info {
-    display: none !important;
-}
-
-/* Pipeline accordions — hidden, not used */
-
-/* Consistent page height — prevents layout shifts */
-.gradio-container .group {
-    min-height: 0 !important;
-}
-
-/* Dummy history overlay */
-.rtl-history-placeholder {
-    position: relative;
-    margin-top: 16px;
-}
-.rtl-history-placeholder table {
-    opacity: 0.35;
-    pointer-events: none;
-}
-.rtl-history-overlay {
-    position: absolute;
-    top: 50%;
-    left: 50%;
-    transform: translate(-50%, -50%);
-    background: white;
-    border: 1px solid #dadce0;
-    border-radius: 12px;
-    padding: 24px 32px;
-    text-align: center;
-    box-shadow: 0 2px 12px rgba(0,0,0,0.08);
-    z-index: 5;
-}
-.rtl-history-overlay h3 {
-    font-size: 1rem !important;
-    margin: 0 0 8px 0 !important;
-}
-.rtl-history-overlay p {
-    color: #5f6368;
-    font-size: 0.85rem;
-    margin: 0;
-}
-
-/* Hide Gradio's built-in progress bars and error toasts — we use our own UI */
-.gradio-container .progress-bar,
-.gradio-container .progress-text,
-.gradio-container .meta-text,
-.gradio-container .progress-level {
-    display: none !important;
-}
-.toast-wrap, .toast-body, .toast-close {
-    display: none !important;
-}
-
-/* Loading spinner */
-@keyframes rtl-spin {
-    0% { transform: rotate(0deg); }
-    100% { transform: rotate(360deg); }
-}
-@keyframes rtl-pulse {
-    0%, 100% { opacity: 1; }
-    50% { opacity: 0.6; }
-}
-.rtl-loading {
-    display: inline-flex;
-    align-items: center;
-    gap: 10px;
-    padding: 10px 18px;
-    background: #e8f0fe;
-    border-radius: 20px;
-    color: #1967d2;
-    font-size: 0.82rem;
-    font-weight: 500;
-    animation: rtl-pulse 2s ease-in-out infinite;
-}
-.rtl-loading-spinner {
-    width: 16px;
-    height: 16px;
-    border: 2.5px solid #d2e3fc;
-    border-top: 2.5px solid #1a73e8;
-    border-radius: 50%;
-    animation: rtl-spin 0.8s linear infinite;
-    flex-shrink: 0;
-}
-
-/* Mobile */
-@media (max-width: 768px) {
-    .rtl-landing-content {
-        flex-direction: column;
-        gap: 32px;
-    }
-    .rtl-landing-diagram {
-        flex: none;
-        width: 100%;
-    }
-    .rtl-landing-text h1 {
-        font-size: 1.8rem !important;
-    }
-    .rtl-metrics-strip {
-        flex-wrap: wrap;
-        gap: 16px;
-    }
-}
-"""
+# Kept in a plain stylesheet so it can be edited (and linted) as CSS
+RTL_CSS = (_ROOT / "spaces_app" / "ui" / "assets" / "rtl.css").read_text(encoding="utf-8")
 
 
 # ─────────────────────────── Example cases ───────────────────────────────────
@@ -742,7 +69,7 @@ def _load_example_manifest() -> list[dict]:
     manifest = config.EXAMPLES_DIR / "manifest.json"
     if not manifest.exists():
         return []
-    data = json.loads(manifest.read_text())
+    data = read_json(manifest)
     return data.get("examples", [])
 
 
@@ -750,20 +77,52 @@ EXAMPLE_CASES = _load_example_manifest()
 
 
 
+# Finished _build_preloaded_demo() outputs per example index, filled once by main()
+_DEMO_CACHE: dict[int, tuple] = {}
+
+# Display-sized JPEG copies of the example images. Kept under the system temp
+# dir, which Gradio serves from without extra allowed_paths.
+DEMO_PREVIEW_DIR = Path(tempfile.gettempdir()) / "rtl_demo_previews"
+_DEMO_PREVIEW_SIZE = (768, 768)
+
+
+def _demo_preview(img_path: Path) -> str:
+    """Return the path of a downscaled JPEG preview of img_path, writing it on first use."""
+    out = DEMO_PREVIEW_DIR / f"{hash_file(img_path)[:16]}.jpg"
+    if not out.exists():
+        DEMO_PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
+        with Image.open(img_path) as img:
+            preview = img.convert("RGB")
+            preview.thumbnail(_DEMO_PREVIEW_SIZE)
+        tmp = out.with_suffix(".tmp")
+        preview.save(tmp, "JPEG", quality=90, optimize=True)
+        tmp.replace(out)
+    return str(out)
+
+
+def _prewarm_demo_cache() -> None:
+    for i in range(len(EXAMPLE_CASES)):
+        _DEMO_CACHE[i] = _build_preloaded_demo(i)
+
+
 def _load_example_case(index: int):
     if index >= len(EXAMPLE_CASES):
         return None, "", ""
-    ex = EXAMPLE_CASES[index]
-    img_path = _ROOT / ex["image_path"]
-    rpt_path = _ROOT / ex["report_path"]
-    image = Image.open(img_path) if img_path.exists() else None
-    report = rpt_path.read_text().strip() if rpt_path.exists() else ""
-    label = ex["label"]
-    return image, label, report
+    return _load_preloaded_demo(index)[:3]
 
 
 def _load_preloaded_demo(index: int):
     """Load example case AND pre-computed mock results for instant demo display."""
+    cached = _DEMO_CACHE.get(index)
+    if cached is None:
+        cached = _build_preloaded_demo(index)
+        if index < len(EXAMPLE_CASES):
+            _DEMO_CACHE[index] = cached
+    return cached
+
+
+def _build_preloaded_demo(index: int):
+    """Read one example and render its mock results: (image, label, report, *result panels)."""
     from core.pipeline.medgemma_client import _MOCK_PNEUMONIA, _MOCK_CHF, _MOCK_NORMAL
     from core.scoring.score import compute_score
 
@@ -773,7 +132,8 @@ def _load_preloaded_demo(index: int):
     ex = EXAMPLE_CASES[index]
     img_path = _ROOT / ex["image_path"]
     rpt_path = _ROOT / ex["report_path"]
-    image = Image.open(img_path) if img_path.exists() else None
+    # A file path lets Gradio serve the preview as-is instead of re-encoding a PIL image per click
+    image = _demo_preview(img_path) if img_path.exists() else None
     report = rpt_path.read_text().strip() if rpt_path.exists() else ""
     label = ex["label"]
 
@@ -781,10 +141,9 @@ def _load_preloaded_demo(index: int):
     mock_sets = [_MOCK_PNEUMONIA, _MOCK_CHF, _MOCK_NORMAL]
     mock = mock_sets[index] if index < len(mock_sets) else _MOCK_PNEUMONIA
 
-    # Deep copy to avoid mutating module-level mock data
-    import copy
-    claims = copy.deepcopy(mock["claim_extraction"]["claims"])
-    alignments = copy.deepcopy(mock["alignment"]["alignments"])
+    # Only top-level keys are set below, so shallow copies keep the mock data intact
+    claims = [dict(c) for c in mock["claim_extraction"]["claims"]]
+    alignments = [dict(a) for a in mock["alignment"]["alignments"]]
 
     # Recalculate sentence_span to match the actual report file text
     for claim in claims:
@@ -876,13 +235,23 @@ _NAV_ACTIVE = {
 _NAV_COUNT = 7  # RTL, Demo, Single Audit, Batch, History, Evaluation, Settings
 
 
-def _nav_btn_updates(page: str) -> tuple:
-    """Return gr.update for each of the 7 nav buttons — active one gets variant='primary'."""
-    active_idx = _NAV_ACTIVE.get(page, -1)
-    return tuple(
-        gr.update(variant="primary") if i == active_idx else gr.update(variant="secondary")
+# Per-page nav button variants and page-info HTML, computed once. The gr.update
+# dicts themselves are still built per call: Gradio pops "value" from update
+# dicts while postprocessing, so a shared one would lose it after first use.
+_NAV_VARIANTS: dict[str, tuple[str, ...]] = {
+    page: tuple(
+        "primary" if i == _NAV_ACTIVE.get(page, -1) else "secondary"
         for i in range(_NAV_COUNT)
     )
+    for page in PAGES
+}
+_PAGE_INFO_HTML: dict[str, str] = {page: _page_info_html(page) for page in PAGES}
+
+
+def _nav_btn_updates(page: str) -> tuple:
+    """Return gr.update for each of the 7 nav buttons — active one gets variant='primary'."""
+    variants = _NAV_VARIANTS.get(page) or ("secondary",) * _NAV_COUNT
+    return tuple(gr.update(variant=v) for v in variants)
 
 
 def _set_views(page: str) -> tuple:
@@ -890,7 +259,7 @@ def _set_views(page: str) -> tuple:
     nav_visible = page != "login"
     return (
         gr.update(visible=nav_visible),
-        gr.update(value=_page_info_html(page)),
+        gr.update(value=_PAGE_INFO_HTML.get(page, "")),
     ) + _nav_btn_updates(page) + tuple(
         gr.update(visible=(page == p)) for p in PAGES
     )
@@ -898,10 +267,10 @@ def _set_views(page: str) -> tuple:
 
 def _after_login_data(state: dict) -> tuple[str, list]:
     """Return (header_html, recent_rows) for the home page."""
-    conn = get_conn(DB_PATH)
     user_id = state["user_id"]
-    name = get_user_display_name(conn, user_id) or "User"
-    recent = list_recent_runs_for_user(conn, user_id, limit=8)
+    with get_conn(DB_PATH) as conn:
+        name = get_user_display_name(conn, user_id) or "User"
+        recent = list_recent_runs_for_user(conn, user_id, limit=8)
 
     mode_class = "rtl-mode-mock" if config.MEDGEMMA_MOCK else "rtl-mode-live"
     mode_text = "Mock" if config.MEDGEMMA_MOCK else "Live MedGemma"
@@ -1021,6 +390,7 @@ light_theme.set(
 def main() -> gr.Blocks:
     ensure_space_storage(storage_dir=STORAGE_DIR, db_path=DB_PATH)
     init_db(DB_PATH, SCHEMA_PATH)
+    _prewarm_demo_cache()
 
     with gr.Blocks(title=APP_TITLE, theme=light_theme, css=RTL_CSS) as demo:
         state = gr.State(_default_state())
@@ -1421,8 +791,8 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
         # ═══════════════════════════════════════════════════════════════════
 
         def do_login(email: str, pw: str, st: dict):
-            conn = get_conn(DB_PATH)
-            uid = authenticate_user(conn, email.strip().lower(), pw)
+            with get_conn(DB_PATH) as conn:
+                uid = authenticate_user(conn, email.strip().lower(), pw)
             if not uid:
                 return (st, _alert("Invalid credentials", "error")) + _set_views("login") + ("", []) + ("", "", "", "", "")
             st["user_id"] = uid
@@ -1431,8 +801,8 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
 
         def do_create(email: str, name: str, pw: str, st: dict):
             try:
-                conn = get_conn(DB_PATH)
-                uid = create_user(conn, email.strip().lower(), name.strip(), pw)
+                with get_conn(DB_PATH) as conn, tx(conn):
+                    uid = create_user(conn, email.strip().lower(), name.strip(), pw)
             except Exception as e:
                 return (st, _alert(str(e), "error")) + _set_views("login") + ("", []) + ("", "", "", "", "")
             st["user_id"] = uid
@@ -1469,23 +839,23 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
                 # Persist to DB only if logged in
                 run_id = result["run_id"]
                 if st.get("user_id"):
-                    conn = get_conn(DB_PATH)
-                    run_id = create_run(
-                        conn,
-                        user_id=st["user_id"],
-                        image_hash=result["image_hash"],
-                        report_hash=result["report_hash"],
-                        case_label=result["case_label"],
-                        model_name=result["model_name"],
-                        model_version=result["model_version"],
-                        lora_id=result.get("lora_id", ""),
-                        prompt_version=result["prompt_version"],
-                        overall_score=result["overall_score"],
-                        severity=result["severity"],
-                        flag_counts=result["flag_counts"],
-                        results_path=result.get("results_path", ""),
-                    )
-                    log_ev(conn, run_id, EventType.PIPELINE_COMPLETE, {"score": result["overall_score"]})
+                    with get_conn(DB_PATH) as conn, tx(conn):
+                        run_id = create_run(
+                            conn,
+                            user_id=st["user_id"],
+                            image_hash=result["image_hash"],
+                            report_hash=result["report_hash"],
+                            case_label=result["case_label"],
+                            model_name=result["model_name"],
+                            model_version=result["model_version"],
+                            lora_id=result.get("lora_id", ""),
+                            prompt_version=result["prompt_version"],
+                            overall_score=result["overall_score"],
+                            severity=result["severity"],
+                            flag_counts=result["flag_counts"],
+                            results_path=result.get("results_path", ""),
+                        )
+                        log_ev(conn, run_id, EventType.PIPELINE_COMPLETE, {"score": result["overall_score"]})
                 st["run_id"] = run_id
                 st["current_result"] = result
 
@@ -1540,32 +910,33 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
             try:
                 from core.batch.runner import run_batch
 
-                extract_dir = config.BATCHES_DIR / "tmp_extract"
                 zip_path = Path(zip_file.name)
 
-                batch_result = run_batch(zip_path, extract_dir)
+                batch_result = run_batch(zip_path)
                 results = batch_result["results"]
                 summary = batch_result["summary"]
 
                 # Persist to DB only if logged in
                 if st.get("user_id"):
-                    conn = get_conn(DB_PATH)
-                    batch_id = create_batch(conn, user_id=st["user_id"],
-                                            zip_name=zip_path.name, num_cases_total=0)
-                    for r in results:
-                        run_id = create_run(
-                            conn, user_id=st["user_id"],
-                            image_hash=r["image_hash"], report_hash=r["report_hash"],
-                            case_label=r["case_label"], model_name=r["model_name"],
-                            model_version=r["model_version"], lora_id=r.get("lora_id", ""),
-                            prompt_version=r["prompt_version"], overall_score=r["overall_score"],
-                            severity=r["severity"], flag_counts=r["flag_counts"],
-                            results_path=r.get("results_path", ""),
-                        )
-                        link_batch_run(conn, batch_id, run_id, r["case_label"])
-                    update_batch_progress(conn, batch_id,
-                        num_done=summary["completed"], num_failed=summary["failed"],
-                        summary=summary, status="complete")
+                    with get_conn(DB_PATH) as conn, tx(conn):
+                        batch_id = create_batch(conn, user_id=st["user_id"],
+                                                zip_name=zip_path.name, num_cases_total=0)
+                        links = []
+                        for r in results:
+                            run_id = create_run(
+                                conn, user_id=st["user_id"],
+                                image_hash=r["image_hash"], report_hash=r["report_hash"],
+                                case_label=r["case_label"], model_name=r["model_name"],
+                                model_version=r["model_version"], lora_id=r.get("lora_id", ""),
+                                prompt_version=r["prompt_version"], overall_score=r["overall_score"],
+                                severity=r["severity"], flag_counts=r["flag_counts"],
+                                results_path=r.get("results_path", ""),
+                            )
+                            links.append((run_id, r["case_label"]))
+                        link_batch_runs_bulk(conn, batch_id, links)
+                        update_batch_progress(conn, batch_id,
+                            num_done=summary["completed"], num_failed=summary["failed"],
+                            summary=summary, status="complete")
 
                 summary_md = (
                     f"**{summary['total_cases']} cases** — "
@@ -1576,6 +947,10 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
                     f"{summary['severity_distribution']['medium']} medium, "
                     f"{summary['severity_distribution']['high']} high"
                 )
+                if summary.get("skipped"):
+                    summary_md += "\n\n**Skipped:**\n" + "\n".join(
+                        f"- {sk['case_id']}: {sk['reason']}" for sk in summary["skipped"]
+                    )
 
                 table_rows = []
                 for r in results:
@@ -1597,8 +972,8 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
         def load_history(severity_filter: str, min_score: int, st: dict):
             if not st.get("user_id"):
                 return gr.update(visible=True), gr.update(visible=False, value=[])
-            conn = get_conn(DB_PATH)
-            runs = list_all_runs_for_user(conn, st["user_id"])
+            with get_conn(DB_PATH) as conn:
+                runs = list_all_runs_for_user(conn, st["user_id"])
             rows = []
             for r in runs:
                 if severity_filter != "All" and r["severity"] != severity_filter:
@@ -1620,9 +995,9 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
                     if p.exists():
                         return gr.update(visible=True, value=str(p))
             if result:
-                tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="w")
-                json.dump(result, tmp, indent=2)
-                tmp.close()
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as tmp:
+                    pass
+                write_json(Path(tmp.name), result)
                 return gr.update(visible=True, value=tmp.name)
             return gr.update(visible=False)
 
@@ -1651,8 +1026,8 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
                     return ("Run not found",) + ("",) * (len(_detail_comps) - 1)
                 result = read_json(p)
 
-                conn = get_conn(DB_PATH)
-                events = list_events_for_run(conn, run_id)
+                with get_conn(DB_PATH) as conn:
+                    events = list_events_for_run(conn, run_id)
 
                 run_md = f"**Run ID:** `{run_id}` | **Created:** {result.get('created_at', '')} | **Case:** {result.get('case_label', '')}"
                 score_h = score_gauge_html(result["overall_score"], result["severity"])
@@ -1743,12 +1118,14 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
         nav_settings.click(lambda st: go_to("settings", st), inputs=[state], outputs=_shared_nav_outputs)
         nav_login.click(lambda st: go_to("login", st), inputs=[state], outputs=_shared_nav_outputs)
 
-        # Single audit — show loading in results area, then run
+        # Single audit — show loading in results area, then run. Gradio's own progress
+        # overlay is hidden on these chains so it doesn't cover the loading card.
         single_run_btn.click(
             lambda: (_loading_results_html(1, 6), "", "", "", "", "", "", ""),
             outputs=[single_score_html, single_flag_html, single_report_html,
                      single_claims_html, single_rewrites_html, single_clinician_md,
                      single_patient_md, single_edited_report],
+            show_progress="hidden",
         ).then(
             run_single_audit,
             inputs=[single_image, single_case_label, single_report, single_lora, state],
@@ -1757,6 +1134,7 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
                 single_report_html, single_claims_html, single_rewrites_html,
                 single_clinician_md, single_patient_md, single_edited_report,
             ],
+            show_progress="hidden",
         )
         single_accept_all.click(accept_all_rewrites, inputs=[state], outputs=[single_edited_report])
 
@@ -1788,10 +1166,12 @@ RTL is a **research demonstration** built for the [MedGemma Impact Challenge](ht
         demo_run_btn.click(
             lambda: (_loading_results_html(1, 6), "", "", "", "", "", ""),
             outputs=_demo_result_outputs,
+            show_progress="hidden",
         ).then(
             _run_demo_with_loading,
             inputs=[demo_image, demo_case_label, demo_report],
             outputs=_demo_result_outputs,
+            show_progress="hidden",
         )
 
         # Batch audit — show loading spinner, then run
@@ -1875,7 +1255,7 @@ def _load_mock_example_md() -> str:
     try:
         p = config.MOCK_RESULTS_PATH
         if p.exists():
-            data = json.loads(p.read_text())
+            data = read_json(p)
             case = data if isinstance(data, dict) else {}
             score = case.get("overall_score", "?")
             sev = case.get("severity", "?")